@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 11:40:03 2026
+
+@author: spl
+
+headless counterpart of iv: crop, annotate, tonemap and collage images without Qt or IPython and write the results
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+
+from pytb.sequence import load_image
+from pytb.utils import annotate_image, collage, nonzero_bounds, tonemap
+
+def as_array(image):
+    if isinstance(image, str):
+        image = load_image(image)
+    return np.atleast_3d(image)
+
+def iter_images(images):
+    # 4D arrays are sliced along the last axis as in iv
+    if isinstance(images, np.ndarray) and images.ndim == 4:
+        return (images[:, :, :, i] for i in range(images.shape[3]))
+    return iter(images)
+
+def crop_bounds(images, processes=None, max_pending=None):
+    """global cropping bounds (y0, y1, x0, x1) over all images, as used by iv's global cropping
+
+    only max_pending images are submitted (and held in memory) at a time
+    """
+    processes = processes or os.cpu_count()
+    max_pending = max_pending or 2 * processes
+    bounds = []
+    with ProcessPoolExecutor(processes) as pool:
+        pending = []
+        for image in iter_images(images):
+            pending.append(pool.submit(image_bounds, image))
+            if len(pending) >= max_pending:
+                bounds.append(pending.pop(0).result())
+        bounds += [job.result() for job in pending]
+    return (min(b[0] for b in bounds), max(b[1] for b in bounds), min(b[2] for b in bounds), max(b[3] for b in bounds))
+
+def image_bounds(image):
+    return nonzero_bounds(as_array(image))
+
+def render(image, index=0, offset=0., scale=1., gamma=1., bounds=None, annotate=False, font_size=12):
+    """crop, annotate and tonemap a single image the same way iv displays it
+
+    bounds: optional cropping bounds (y0, y1, x0, x1), True crops to the image's own bounds
+    """
+    image = as_array(image)
+    if bounds is True:
+        bounds = nonzero_bounds(image)
+    if bounds:
+        image = image[bounds[0] : bounds[1], bounds[2] : bounds[3], :]
+    if annotate:
+        image = annotate_image(image, str(index), font_size=font_size)
+    return tonemap(image, offset, scale, gamma)
+
+def write_image(fname, image):
+    """write a tonemapped image, .npy and .exr keep floats, all other formats are written with 8 bits by imageio"""
+    ext = os.path.splitext(fname)[1].lower()
+    if ext == '.npy':
+        np.save(fname, image)
+    elif ext == '.exr':
+        import pyexr
+        pyexr.write(fname, image.astype(np.float32))
+    else:
+        import imageio
+        imageio.imwrite(fname, np.rint(255 * np.clip(image, 0., 1.)).astype(np.uint8))
+
+def render_to_file(image, index, fname, kwargs):
+    write_image(fname, render(image, index, **kwargs))
+    return fname
+
+def export(images, fname_pattern, offset=0., scale=1., gamma=1., crop=False, crop_global=True, annotate=False,
+           font_size=12, processes=None, max_pending=None):
+    """render each image to fname_pattern % index in a process pool
+
+    images: list of arrays or file names, a 4D array or any other iterable of images (e.g. a pytb.sequence.ImageSequence)
+    with global cropping, images is iterated twice
+    this is a generator yielding the written file names in order, only max_pending images are held in memory at a time;
+    nothing is written unless it is iterated, e.g. by list(export(...))
+    """
+    processes = processes or os.cpu_count()
+    max_pending = max_pending or 2 * processes
+    # True: each image is cropped to its own bounds
+    bounds = crop_bounds(images, processes, max_pending) if crop and crop_global else crop
+    kwargs = dict(offset=offset, scale=scale, gamma=gamma, bounds=bounds, annotate=annotate, font_size=font_size)
+    with ProcessPoolExecutor(processes) as pool:
+        pending = []
+        for index, image in enumerate(iter_images(images)):
+            pending.append(pool.submit(render_to_file, image, index, fname_pattern % index, kwargs))
+            if len(pending) >= max_pending:
+                yield pending.pop(0).result()
+        for job in pending:
+            yield job.result()
+
+def export_collage(images, fname, nr=None, nc=None, bw=0, bv=0., transpose=False, transposeIms=False, offset=0., scale=1.,
+                   gamma=1., crop=False, crop_global=True, annotate=False, font_size=12):
+    """arrange all images in a collage as iv does and write it to fname"""
+    images = [as_array(image) for image in iter_images(images)]
+    if crop and crop_global:
+        bounds = [nonzero_bounds(image) for image in images]
+        bounds = [(min(b[0] for b in bounds), max(b[1] for b in bounds), min(b[2] for b in bounds), max(b[3] for b in bounds))] * len(images)
+    else:
+        bounds = [crop and nonzero_bounds(image) for image in images]
+    images = [image[b[0] : b[1], b[2] : b[3], :] if b else image for image, b in zip(images, bounds)]
+    if annotate:
+        images = [annotate_image(image, str(i), font_size=font_size) for i, image in enumerate(images)]
+    kwargs = dict(bw=bw, bv=bv, transpose=transpose, transposeIms=transposeIms)
+    if not nc is None:
+        kwargs['nc'] = nc
+    if not nr is None:
+        kwargs['nr'] = nr
+    coll = collage(images, **kwargs)
+    write_image(fname, tonemap(coll, offset, scale, gamma))
+    return fname
@@ -6,15 +6,19 @@ Created on Thu Oct 18 19:24:05 2018
 
 """
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from functools import wraps
 import imageio
 from IPython import get_ipython
 import numpy as np
 import sys
+import threading
 import traceback
 import time
 import types
+import weakref
 
 import PyQt5.QtCore as QtCore
 from PyQt5.QtCore import Qt
@@ -38,7 +42,8 @@ import matplotlib.gridspec as gridspec
 
 import torch
 
-from pytb.utils import pad
+from pytb.sequence import FrameRing, ImageSequence, image_sequence, is_lazy_source
+from pytb.utils import HistogramSketch, collage, downsample, finite_values, nonzero_bounds, quantize, samples_for_error, tonemap
 
 '''
 def MyPyQtSlot(*args):
@@ -57,12 +62,31 @@ def MyPyQtSlot(*args):
     return slotdecorator
 '''
 
+def as_image(im):
+    # convert a single input to an image array with dimensions [y, x, channels]
+    if isinstance(im, torch.Tensor):
+        im = im.detach().cpu().numpy()
+        if im.ndim == 4:
+            # probably a torch tensor with dimensions [batch, channels, y, x]
+            im = im.transpose((2, 3, 1, 0))
+        elif im.ndim > 4:
+            raise Exception('torch tensors can at most have 4 dimensions')
+            
+    im = np.atleast_3d(im)
+    if im.shape[2] != 1 and im.shape[2] != 3:
+        if im.ndim == 4:
+            im = im.transpose((2, 3, 1, 0))
+    return im
+
 class iv(QMainWindow):
     zoom_factor = 1.1
     x_zoom = True
     y_zoom = True
     x_stop_at_orig = True
     y_stop_at_orig = True
+    pyramidReady = QtCore.pyqtSignal(object, object) # pyramid key, finished future
+    prefetchReady = QtCore.pyqtSignal(object, object) # image key, finished future
+    streamUpdated = QtCore.pyqtSignal()
 
     def __init__(self, *args, **kwargs):
         app = QtCore.QCoreApplication.instance()
@@ -74,7 +98,8 @@ class iv(QMainWindow):
         self.setWindowTitle('iv ' + timestamp)
         
         shell = get_ipython()
-        shell.magic('%matplotlib qt')
+        if not shell is None:
+            shell.magic('%matplotlib qt')
 
         # store list of input images
         if len(args) == 1 and isinstance(args[0], torch.Tensor):
@@ -82,15 +107,20 @@ class iv(QMainWindow):
             if args[0].ndim <= 3:
                 self.images = [args[0].detach().cpu().numpy()]
             elif args[0].ndim == 4:
-                # probably a torch tensor with dimensions [batch, channels, y, x]
-                self.images = [[]] * args[0].shape[0]
-                tmp = args[0].detach().cpu().numpy().transpose((2, 3, 1, 0))
-                for imind in range(tmp.shape[3]):
-                    self.images[imind] = tmp[:, :, :, imind]
-                del tmp
+                # probably a torch tensor with dimensions [batch, channels, y, x], only convert the images that are viewed
+                # (zero-copy for contiguous cpu tensors)
+                batch = args[0].detach()
+                self.images = ImageSequence(lambda i: batch[i].cpu().numpy().transpose((1, 2, 0)), batch.shape[0],
+                                            cache_bytes=kwargs.get('cache_bytes', 2 ** 30), prepare=np.atleast_3d)
             else:
                 raise Exception('torch tensors can at most have 4 dimensions')
         
+        elif len(args) == 1 and is_lazy_source(args[0]):
+            # file names, memory-mapped / HDF5 arrays or callables: load images on demand
+            # axis: image axis of 4D arrays
+            self.images = image_sequence(args[0], nims=kwargs.get('nims'), axis=kwargs.get('axis', -1),
+                                         cache_bytes=kwargs.get('cache_bytes', 2 ** 30))
+        
         elif len(args) == 1 and isinstance(args[0], np.ndarray) and len(args[0].shape) == 4:
             # handle 4D numpy.ndarray input by slicing in 4th dimension
             self.images = [[]] * args[0].shape[3]
@@ -103,23 +133,30 @@ class iv(QMainWindow):
         else:
             self.images = list(args)
         
-        for imind in range(len(self.images)):
-            if isinstance(self.images[imind], torch.Tensor):
-                self.images[imind] = self.images[imind].detach().cpu().numpy()
-                if self.images[imind].ndim == 4:
-                    # probably a torch tensor with dimensions [batch, channels, y, x]
-                    self.images[imind] = self.images[imind].transpose((2, 3, 1, 0))
-                elif self.images[imind].ndim > 4:
-                    raise Exception('torch tensors can at most have 4 dimensions')
-                    
-            self.images[imind] = np.atleast_3d(self.images[imind])
-            if self.images[imind].shape[2] != 1 and self.images[imind].shape[2] != 3:
-                if self.images[imind].ndim == 4:
-                    
-                    self.images[imind] = self.images[imind].transpose((2, 3, 1, 0))
+        if isinstance(self.images, list):
+            if any(isinstance(im, torch.Tensor) for im in self.images):
+                # convert tensors only when they are viewed
+                items = self.images
+                self.images = ImageSequence(items.__getitem__, len(items), cache_bytes=kwargs.get('cache_bytes', 2 ** 30), prepare=as_image)
+            else:
+                self.images = [as_image(im) for im in self.images]
+
+        self.backend = kwargs.get('backend', 'matplotlib') # 'matplotlib' or 'qimage'
+        self.dtype = kwargs.get('dtype') # optional compact storage type (e.g. np.float16), images are converted with astype
+        if not self.dtype is None:
+            if isinstance(self.images, ImageSequence):
+                prepare = self.images.prepare
+                self.images.prepare = lambda im: (im if prepare is None else prepare(im)).astype(self.dtype, copy=False)
+            else:
+                self.images = [im.astype(self.dtype, copy=False) for im in self.images]
+        self.streaming = kwargs.get('stream', False) # images are going to be pushed by other threads
+        if self.streaming:
+            self.images = self.get_stream(kwargs)
 
         self.imind = 0 # currently selected image
         self.nims = len(self.images)
+        # images dropped from the stream as of self.nims / self.imind, see sync_stream
+        self.stream_dropped = self.images.dropped if isinstance(self.images, FrameRing) else 0
         self.scale = 1.
         self.gamma = 1.
         self.offset = 0.
@@ -127,6 +164,16 @@ class iv(QMainWindow):
         self.autoscaleUsePrctiles = True
         self.autoscaleOnChange = False
         self.autoscalePerImg = False
+        self.autoscaleExact = kwargs.get('autoscale_exact', False) # use np.percentile instead of histogram sketches
+        self.autoscaleBits = kwargs.get('autoscale_bits', 20) # resolution of the sketches, see HistogramSketch
+        # approximate statistics from a random subsample of autoscaleSamples values, alternatively given by the
+        # tolerated percentile error (in percent of the ranks, holds with 95% confidence)
+        self.autoscaleSamples = kwargs.get('autoscale_samples')
+        if not kwargs.get('autoscale_error') is None:
+            self.autoscaleSamples = samples_for_error(kwargs['autoscale_error'])
+        self.img_stats = dict() # image key -> HistogramSketch
+        self.img_limits = dict() # (image key, percentile, exact) -> (lower, upper), percentile is None for min / max
+        self.stats_pool = ThreadPoolExecutor()
         self.collageActive = False
         self.collageTranspose = False
         self.collageTransposeIms = False
@@ -134,8 +181,14 @@ class iv(QMainWindow):
         self.collage_nr = int(np.ceil(self.nims / self.collage_nc))
         self.collage_border_width = 0
         self.collage_border_value = 0.
+        self.collage_key = None # layout and image state the cached collage was assembled for
+        self.collage_raw = None # assembled, untonemapped collage
         self.crop        = kwargs.get('crop', False)
         self.crop_global = kwargs.get('crop_global', True)
+        self.img_bounds = dict() # image index -> cropping bounds (y0, y1, x0, x1), computed when first needed
+        self.global_bounds = None # union of all bounds in self.img_bounds
+        self.crop_lock = threading.Lock()
+        self.crop_pool = ThreadPoolExecutor()
         self.zoom_factor = 1.1
         self.x_zoom = True
         self.y_zoom = True
@@ -143,8 +196,55 @@ class iv(QMainWindow):
         self.y_stop_at_orig = True
         self.annotate = False
         self.font_size = 12
+        self.quantize_floats = kwargs.get('quantize', False) # tonemap float images via 16 bit lookup tables
+        self.quantized = OrderedDict() # (image key, level) -> (weakref(im), codes, lo, step), least recently used first
+        self.quantized_max = 2 * kwargs.get('prefetch', 2) + 3 # displayed image (and its pyramid level), prefetched images
+        self.quantized_lock = threading.Lock()
+        self.annotated = OrderedDict() # image key -> annotated image, least recently used first
+        self.annotated_max = 2 * kwargs.get('prefetch', 2) + 1 # displayed and prefetched images
+        self.annotated_lock = threading.Lock()
+        self.viewport_margin = kwargs.get('viewport_margin', 0.25) # rendered margin around the visible region, relative to its size
+        self.display_im = None # untonemapped image (or collage) currently shown
+        self.display_size = None
+        self.rendered_window = None # (y0, y1, x0, x1) region of display_im that has been tonemapped
+        self.rendered_level = 0
+        self.render_buffer = None # reused output of tonemap
+        self.display_key = None # identifies display_im in self.pyramids
+        self.pyramid_min_pixels = kwargs.get('pyramid_min_pixels', 2 ** 22) # smaller images are always shown at full resolution
+        self.downsample_mode = kwargs.get('downsample', 'mean') # 'mean' or 'max' (keeps hot pixels) for reduced resolutions
+        # display key + (downsample mode,) -> list of successively halved resolution levels, least recently used first
+        # both dicts are only accessed from the Qt thread
+        self.pyramids = OrderedDict()
+        self.pyramid_bytes = kwargs.get('pyramid_bytes', 2 ** 28) # memory for pyramids of other than the displayed image
+        self.pyramid_jobs = dict() # display key + (downsample mode,) -> pending future
+        self.pyramid_pool = ThreadPoolExecutor(max_workers=1)
+        self.pyramidReady.connect(self.onpyramidready)
+        self.prefetch_count = kwargs.get('prefetch', 2) # number of images to prepare ahead in each direction
+        self.prefetch_pool = ThreadPoolExecutor(max_workers=kwargs.get('prefetch_workers', 2))
+        # the prefetch dicts are only accessed from the Qt thread, workers hand their results over via prefetchReady
+        self.prefetch_jobs = dict() # image key -> future, until its result is stored
+        self.prefetched_raw = dict() # image key -> output of get_img
+        self.prefetched_tm = dict() # image key -> ((offset, scale, gamma, window), tonemapped window)
+        self.prefetchReady.connect(self.onprefetchready)
+        self.frame_interval = int(1000 / kwargs.get('max_fps', 60)) # minimum time between redraws in ms
+        self.draw_timer = QtCore.QTimer()
+        self.draw_timer.setSingleShot(True)
+        self.draw_timer.timeout.connect(self.draw)
+        self.blit_background = None # figure without the image while panning
+        self.scroll_timer = QtCore.QTimer()
+        self.scroll_timer.setSingleShot(True)
+        self.scroll_timer.timeout.connect(self.apply_scroll)
+        self.scroll_kind = None # pending wheel action, its steps are accumulated until the timer fires
+        self.scroll_steps = 0
+        self.scroll_pos = None
+        self.stream_lock = threading.Lock()
+        self.stream_dirty = False # images were pushed since the last update of the display
+        self.stream_timer = QtCore.QTimer()
+        self.stream_timer.setSingleShot(True)
+        self.stream_timer.timeout.connect(self.onstream)
+        self.stream_interval = int(1000 / kwargs.get('stream_fps', 10)) # minimum time between display updates in ms
+        self.streamUpdated.connect(lambda: self.stream_timer.isActive() or self.stream_timer.start(self.stream_interval))
         
-        self.crop_bounds()
         self.initUI()
         
         self.ax.set_xticks([])
@@ -177,20 +277,22 @@ class iv(QMainWindow):
         self.setWindowModality(QtCore.Qt.WindowModal)
         self.show()
 
-    def crop_bounds(self):
-        # pre-compute cropping bounds (tight bounding box around non-zero pixels)
-        nzs = [np.where(np.sum(im, axis=2) > 0) for im in self.images]
-        self.xmins = [np.min(nz[1]) if len(nz[1]) else 0 for nz in nzs]
-        self.xmaxs = [np.max(nz[1]) + 1 if len(nz[1]) else im.shape[1] for nz, im in
-                      zip(nzs, self.images)]  # +1 to allow easier indexing
-        self.ymins = [np.min(nz[0]) if len(nz[0]) else 0 for nz in nzs]
-        self.ymaxs = [np.max(nz[0]) + 1 if len(nz[0]) else im.shape[0] for nz, im in
-                      zip(nzs, self.images)]  # +1 to allow easier indexing
+    def crop_bounds(self, inds):
+        # compute missing cropping bounds (tight bounding box around non-zero pixels) in parallel over images
+        missing = [i for i in inds if not i in self.img_bounds]
+        for i, bounds in zip(missing, self.crop_pool.map(lambda i: nonzero_bounds(self.get_raw_img(i)), missing)):
+            with self.crop_lock:
+                self.img_bounds[i] = bounds
+                gb = self.global_bounds
+                self.global_bounds = bounds if gb is None else (min(gb[0], bounds[0]), max(gb[1], bounds[1]),
+                                                                min(gb[2], bounds[2]), max(gb[3], bounds[3]))
+
+    def get_crop_bounds(self, i):
         if self.crop_global:
-            self.xmins = [np.min(self.xmins) for _ in self.xmins]
-            self.xmaxs = [np.max(self.xmaxs) for _ in self.xmaxs]
-            self.ymins = [np.min(self.ymins) for _ in self.ymins]
-            self.ymaxs = [np.max(self.ymaxs) for _ in self.ymaxs]
+            self.crop_bounds(range(self.nims))
+            return self.global_bounds
+        self.crop_bounds([i])
+        return self.img_bounds[i]
 
     def initUI(self):
         #self.fig = plt.figure(figsize = (10, 10))
@@ -198,12 +300,19 @@ class iv(QMainWindow):
         
         self.widget = QWidget()
         
-        self.fig = Figure(dpi=100)
-        self.canvas = FigureCanvas(self.fig)
-        self.canvas.setParent(self.widget)
-        
-        #self.ax = Axes(fig=self.fig, rect=[0,0,1,1])
-        self.ax = self.fig.add_subplot(111)
+        if self.backend == 'qimage':
+            # draw directly with QPainter, the canvas also takes the roles of figure and axes
+            from pytb.qcanvas import ImageCanvas
+            self.canvas = ImageCanvas(self.widget)
+            self.fig = self.canvas
+            self.ax = self.canvas
+        else:
+            self.fig = Figure(dpi=100)
+            self.canvas = FigureCanvas(self.fig)
+            self.canvas.setParent(self.widget)
+            
+            #self.ax = Axes(fig=self.fig, rect=[0,0,1,1])
+            self.ax = self.fig.add_subplot(111)
         self.ax.set_position(Bbox([[0, 0], [1, 1]]))
         self.ax.set_anchor('NW')
         try:
@@ -232,7 +341,7 @@ class iv(QMainWindow):
         self.uiCBAutoscaleOnChange.setCheckState(self.autoscaleOnChange)
         self.uiCBAutoscaleOnChange.setTristate(False)
         self.uiCBAutoscaleOnChange.stateChanged.connect(lambda state: self.callbackCheckBox(self.uiCBAutoscaleOnChange, state))
-        if self.nims > 1:
+        if self.nims > 1 or self.streaming:
             self.uiCBAutoscalePerImg = QCheckBox('per image')
             self.uiCBAutoscalePerImg.setCheckState(self.autoscalePerImg)
             self.uiCBAutoscalePerImg.setTristate(False)
@@ -287,7 +396,7 @@ class iv(QMainWindow):
         form.addRow(QLabel('autoScale:'), self.uiCBAutoscaleUsePrctiles)
         form.addRow(QLabel('percentile:'), self.uiLEAutoscalePrctile)
         form.addRow(QLabel('autoScale:'), self.uiCBAutoscaleOnChange)
-        if self.nims > 1:
+        if self.nims > 1 or self.streaming:
             form.addRow(QLabel('autoScale:'), self.uiCBAutoscalePerImg)
             form.addRow(QLabel('collage:'), self.uiCBCollageActive)
             form.addRow(QLabel('collage:'), self.uiCBCollageTranspose)
@@ -320,7 +429,7 @@ class iv(QMainWindow):
         sp.setVerticalStretch(1)
         self.canvas.setSizePolicy(sp)
         
-        self.ih = self.ax.imshow(np.zeros(self.get_img().shape[:2] + (3,)), origin='upper')
+        self.ih = self.ax.imshow(np.zeros((1, 1, 3)), origin='upper')
         self.ax.set_position(Bbox([[0, 0], [1, 1]]))
         try:
             self.ax.get_yaxis().set_inverted(True)
@@ -395,7 +504,6 @@ class iv(QMainWindow):
             self.updateImage()
         elif ui == self.uiCBCropGlobal:
             self.crop_global = bool(state)
-            self.crop_bounds()
             self.updateImage()
         elif ui == self.uiCBAnnotate:
             self.annotate = bool(state)
@@ -439,6 +547,8 @@ class iv(QMainWindow):
         print('   [prctile_low, prctile_high] -> [0, 1], ')
         print('   prctiles can be changed via ctrl+shift+wheel')
         print('c: toggle autoscale on image change')
+        print('d: toggle downsampling of zoomed out images between ')
+        print('   averaging and maximum (keeps hot pixels visible)')
         print('G: reset gamma to 1')
         print('L: create collage by arranging all images in a ')
         print('   rectangular manner')
@@ -460,46 +570,109 @@ class iv(QMainWindow):
         print('left mouse dragged:   pan image')
         print('')
     
+    def get_raw_img(self, i):
+        # pushed images may be dropped at any time, indices beyond the remaining ones then refer to the newest image
+        return self.images.get(i) if isinstance(self.images, FrameRing) else self.images[i]
+
+    def get_cropped_img(self, i):
+        im = self.get_raw_img(i)
+        if self.crop:
+            y0, y1, x0, x1 = self.get_crop_bounds(i)
+            im = im[y0 : y1, x0 : x1, :]
+        return im
+
     def get_img(self, i=None):
         if i is None:
             i = self.imind
-        im = self.images[i]
-        if self.crop:
-            im = im[self.ymins[i] : self.ymaxs[i], self.xmins[i] : self.xmaxs[i], :]
-        if self.annotate:
-            from pytb.utils import annotate_image
-            im = annotate_image(im, str(i), font_size=self.font_size)
+        if not self.annotate:
+            return self.get_cropped_img(i)
+        # annotating copies the image, keep the result for further rendering (and prefetching) of the same image
+        key = self.get_img_key(i)
+        with self.annotated_lock:
+            im = self.annotated.get(key)
+            if not im is None:
+                self.annotated.move_to_end(key)
+                return im
+        from pytb.utils import annotate_image
+        im = annotate_image(self.get_cropped_img(i), str(i), font_size=self.font_size)
+        with self.annotated_lock:
+            self.annotated[key] = im
+            while len(self.annotated) > self.annotated_max:
+                self.annotated.popitem(last=False)
         return im
     
+    def get_img_key(self, i=None):
+        # identifies the output of get_img(i), changes whenever the image, cropping or annotation change
+        if i is None:
+            i = self.imind
+        frame_id = self.images.frame_id(i) if isinstance(self.images, FrameRing) else 0
+        return ('img', i, frame_id, self.crop, self.crop_global, self.annotate, self.font_size)
+
     def get_imgs(self):
-        return [self.get_img(ind) for ind in range(len(self.images))]
+        ims = [self.get_cropped_img(ind) for ind in range(len(self.images))]
+        if self.annotate:
+            from pytb.utils import annotate_images
+            ims = annotate_images(ims, range(len(ims)), font_size=self.font_size)
+        return ims
     
     def copy_to_clipboard(self):
         from PyQt5.Qt import QImage
-        im = (255 * self.ih.get_array()).astype(np.uint8)
+        im = self.tonemap(self.display_im, key=self.get_quantized_key())
         h, w, nc = im.shape[:3]
         im = QImage(im.tobytes(), w, h, nc * w, QImage.Format_RGB888)
         c = QApplication.clipboard()
         c.setImage(im)
     
+    def get_stats(self, i=None):
+        # histogram sketch of the cropped image i, computed once per image and cropping state
+        # (annotations are left out, they would need to be rendered and should not influence the scaling anyway)
+        if i is None:
+            i = self.imind
+        key = self.get_img_key(i)[:5]
+        stats = self.img_stats.get(key)
+        if stats is None:
+            stats = HistogramSketch.from_image(self.get_cropped_img(i), bits=self.autoscaleBits, max_samples=self.autoscaleSamples)
+            self.img_stats[key] = stats
+        return stats
+
+    def get_img_limits(self, i=None):
+        # lower / upper autoscale limits of image i, cached per image, cropping state (and annotation for exact limits)
+        # and percentile, non-finite values are ignored
+        if i is None:
+            i = self.imind
+        prctile = self.autoscalePrctile if self.autoscaleUsePrctiles else None
+        key = (self.get_img_key(i) if self.autoscaleExact else self.get_img_key(i)[:5], prctile, self.autoscaleExact)
+        limits = self.img_limits.get(key)
+        if limits is None:
+            if self.autoscaleExact:
+                im = finite_values(self.get_img(i))
+                if im.size == 0:
+                    limits = (0., 0.)
+                else:
+                    limits = tuple(np.percentile(im, (prctile, 100 - prctile))) if self.autoscaleUsePrctiles else (np.min(im), np.max(im))
+            else:
+                stats = self.get_stats(i)
+                limits = tuple(stats.percentile((prctile, 100 - prctile))) if self.autoscaleUsePrctiles \
+                    else (stats.lo, stats.hi)
+            self.img_limits[key] = limits
+        return limits
+
+    def map_images(self, func):
+        # func over all images, spread across stats_pool
+        # global cropping bounds are computed beforehand instead of by every worker at once
+        if self.crop and self.crop_global:
+            self.crop_bounds(range(self.nims))
+        return list(self.stats_pool.map(func, range(self.nims)))
+
     def autoscale(self):
         # autoscale between user-selected percentiles
-        if self.autoscaleUsePrctiles:
-            if self.autoscalePerImg:
-                lower, upper = np.percentile(self.get_img(), (self.autoscalePrctile, 100 - self.autoscalePrctile))
-            else:
-                limits = [np.percentile(image, (self.autoscalePrctile, 100 - self.autoscalePrctile)) for image in self.get_imgs()]
-                lower = np.min([lims[0] for lims in limits])
-                upper= np.max([lims[1] for lims in limits])
-        else:
-            if self.autoscalePerImg:
-                lower = np.min(self.get_img())
-                upper = np.max(self.get_img())
-            else:
-                lower = np.min([np.min(image) for image in self.get_imgs()])
-                upper = np.max([np.max(image) for image in self.get_imgs()])
+        self.sync_stream()
+        limits = [self.get_img_limits()] if self.autoscalePerImg else self.map_images(self.get_img_limits)
+        lower = np.min([lims[0] for lims in limits])
+        upper = np.max([lims[1] for lims in limits])
         self.setOffset(lower, False)
-        self.setScale(1. / (upper - lower), True)
+        # constant images keep the current scale
+        self.setScale(1. / (upper - lower) if upper > lower else self.scale, True)
 
     def toggleautoscaleUsePrctiles(self):
         self.autoscaleUsePrctiles = not self.autoscaleUsePrctiles
@@ -521,71 +694,28 @@ class iv(QMainWindow):
             nc = self.collage_nc
             nr = self.collage_nr
         
-        # pad array so it matches the product nc * nr
-        padding = nc * nr - self.nims
-        ims = self.get_imgs()
-        h = np.max([im.shape[0] for im in ims])
-        w = np.max([im.shape[1] for im in ims])
-        numChans = np.max([im.shape[2] for im in ims])
-        ims = [pad(im, new_width=w, new_height=h, new_num_channels=numChans) for im in ims]
-        ims += [np.zeros((h, w, numChans))] * padding
-        coll = np.stack(ims, axis=3)
-        coll = np.reshape(coll, (h, w, numChans, nc, nr))
-        # 0  1  2   3   4
-        # y, x, ch, co, ro
-        if self.collage_border_width:
-            # pad each patch by border if requested
-            coll = np.append(coll, self.collage_border_value * np.ones((self.collage_border_width, ) + coll.shape[1 : 5]), axis=0)
-            coll = np.append(coll, self.collage_border_value * np.ones((coll.shape[0], self.collage_border_width) + coll.shape[2 : 5]), axis=1)
-        if self.collageTranspose:
-            nim0 = nr
-            nim1 = nc
-            if self.collageTransposeIms:
-                dim0 = w
-                dim1 = h
-                #                          nr w  nc h  ch
-                coll = np.transpose(coll, (4, 1, 3, 0, 2))
-            else:
-                dim0 = h
-                dim1 = w
-                #                          nr h  nc w  ch
-                coll = np.transpose(coll, (4, 0, 3, 1, 2))
-        else:
-            nim0 = nc
-            nim1 = nr
-            if self.collageTransposeIms:
-                dim0 = w
-                dim1 = h
-                #                          nc w  nr h  ch
-                coll = np.transpose(coll, (3, 1, 4, 0, 2))
-            else:
-                dim0 = h
-                dim1 = w
-                #                          nc h  nr w  ch
-                coll = np.transpose(coll, (3, 0, 4, 1, 2))
-        coll = np.reshape(coll, ((dim0 + self.collage_border_width) * nim0, (dim1 + self.collage_border_width) * nim1, numChans))
-        
-        #self.ih.set_data(self.tonemap(coll))
-        self.ax.clear()
-        self.ih = self.ax.imshow(self.tonemap(coll), origin='upper')
-        
-        height, width = self.ih.get_size()
-        lims = (-0.5, width - 0.5, -0.5, height - 0.5)
-        self.ax.set(xlim = lims[0:2], ylim = lims[2:4])
-        try:
-            self.ax.get_yaxis().set_inverted(True)
-        except Exception:
-            self.ax.invert_yaxis()
-        self.fig.canvas.draw()
+        # only re-assemble when the layout or the images changed, display parameters are applied by tonemap
+        key = ('collage', None, nr, nc, self.collage_border_width, self.collage_border_value, self.collageTranspose,
+               self.collageTransposeIms, tuple(self.get_img_key(ind) for ind in range(self.nims)))
+        if key != self.collage_key:
+            self.collage_raw = self.assemble_collage(nr, nc)
+            self.collage_key = key
+        self.set_display(self.collage_raw, key)
+        self.request_draw()
+
+    def assemble_collage(self, nr, nc):
+        # the images' storage type is kept, conversion to float only happens while tonemapping
+        return collage(self.get_imgs(), nr=nr, nc=nc, bw=self.collage_border_width, bv=self.collage_border_value,
+                       transpose=self.collageTranspose, transposeIms=self.collageTransposeIms)
     
     def switch_to_single_image(self):
         if self.collageActive:
-            self.ax.clear()
-            self.ih = self.ax.imshow(np.zeros(self.get_img().shape[:3]), origin='upper')
+            # force new axes for single image dimensions
+            self.display_size = None
         self.collageActive = False
         
     def reset_zoom(self):
-        height, width = self.ih.get_size()
+        height, width = self.display_size
         lims = (-0.5, width - 0.5, -0.5, height - 0.5)
         self.ih.axes.axis(lims)
         self.ax.set_position(Bbox([[0, 0], [1, 1]]))
@@ -593,7 +723,8 @@ class iv(QMainWindow):
             self.ax.get_yaxis().set_inverted(True)
         except Exception:
             self.ax.invert_yaxis()
-        self.fig.canvas.draw()
+        self.render()
+        self.request_draw()
         
     def zoom(self, pos, factor):
         lims = self.ih.axes.axis();
@@ -613,7 +744,7 @@ class iv(QMainWindow):
             ylim = [pos[1] - factor * below, pos[1] + factor * above]
         
         # no zooming out beyond original zoom level
-        height, width = self.ih.get_size()
+        height, width = self.display_size
         
         if self.x_stop_at_orig:
             xlim = [np.maximum(-0.5, xlim[0]), np.minimum(width - 0.5, xlim[1])]
@@ -630,64 +761,314 @@ class iv(QMainWindow):
             except Exception:
                 self.ax.invert_yaxis()
             self.ax.set_position(Bbox([[0, 0], [1, 1]]))
-            self.fig.canvas.draw()
+            self.render()
+            self.request_draw()
         return
         
-    def tonemap(self, im):
-        if isinstance(im, np.matrix):
-            im = np.array(im)
-        if im.shape[2] == 1:
-            im = np.repeat(im, 3, axis=2)
-        elif im.shape[2] == 2:
-            im = np.concatenate((im, np.zeros((im.shape[0], im.shape[1], 2), dtype=im.dtype)), axis=2)
-        elif im.shape[2] != 3:
-            # project to RGB
-            raise Exception('spectral to RGB conversion not implemented')
-        return np.power(np.maximum(0., np.minimum(1., (im - self.offset) * self.scale)), 1. / self.gamma)
+    def get_quantized(self, im, key=None):
+        # quantize each float image only once, its codes are reused for all further tonemapping
+        # key: (image key, pyramid level) of im, cropped / annotated images are new arrays on each get_img call
+        # and can therefore only be recognized by their key, images without key are recognized by identity
+        if key is None:
+            key = id(im)
+        with self.quantized_lock:
+            entry = self.quantized.get(key)
+            if not entry is None and (not isinstance(key, int) or entry[0]() is im):
+                self.quantized.move_to_end(key)
+                return entry[1:]
+        codes, lo, step = quantize(im, bits=16)
+        entry = (weakref.ref(im), codes, lo, step)
+        with self.quantized_lock:
+            self.quantized[key] = entry
+            while len(self.quantized) > self.quantized_max:
+                self.quantized.popitem(last=False)
+        return entry[1:]
+
+    def tonemap(self, im, window=None, out=None, key=None):
+        # window: optional (y0, y1, x0, x1) region, only that part of im is tonemapped into a uint8 display image
+        quantized = None
+        if self.quantize_floats and im.dtype.kind == 'f':
+            # quantize the whole image (cached) so that codes can be reused for other windows
+            quantized = self.get_quantized(im, key)
+        return tonemap(im, self.offset, self.scale, self.gamma, window, quantized, out=out, dtype=np.uint8)
         
-    def updateImage(self):
-        if self.collageActive:
-            self.collage()
+    def get_quantized_key(self, level=0):
+        # identifies the quantized codes of the displayed image or one of its pyramid levels
+        # pyramid levels depend on the downsampling mode as well
+        return None if self.display_key is None else (self.get_pyramid_key() if level else self.display_key, level)
+
+    def get_viewport(self, margin=0.):
+        # visible region of the displayed image in pixel indices (y0, y1, x0, x1), extended by margin
+        height, width = self.display_size
+        x0, x1 = sorted(self.ax.get_xlim())
+        y0, y1 = sorted(self.ax.get_ylim())
+        mx = margin * (x1 - x0)
+        my = margin * (y1 - y0)
+        x0 = int(np.clip(np.floor(x0 + 0.5 - mx), 0, width - 1))
+        x1 = int(np.clip(np.ceil(x1 + 0.5 + mx), x0 + 1, width))
+        y0 = int(np.clip(np.floor(y0 + 0.5 - my), 0, height - 1))
+        y1 = int(np.clip(np.ceil(y1 + 0.5 + my), y0 + 1, height))
+        return y0, y1, x0, x1
+
+    def build_pyramid(self, key, im):
+        # runs in self.pyramid_pool: level i has 1 / 2^i of the base resolution, coarsest level fits into 512 x 512
+        levels = [im]
+        while max(levels[-1].shape[:2]) > 512:
+            levels.append(downsample(levels[-1], mode=key[-1]))
+        # level 0 is display_im itself, do not keep it alive (e.g. beyond eviction from an image cache)
+        levels[0] = None
+        return levels
+
+    def get_pyramid_key(self, key=None):
+        if key is None:
+            key = self.display_key
+        return None if key is None else key + (self.downsample_mode,)
+
+    def request_pyramid(self, key, im):
+        key = self.get_pyramid_key(key)
+        # drop queued pyramids of images that are not shown anymore
+        # (cancelling calls onpyramidready right away, hence the jobs are removed first)
+        for other in [k for k, job in self.pyramid_jobs.items() if k != key and not job.running()]:
+            self.pyramid_jobs.pop(other).cancel()
+        if key is None or im.shape[0] * im.shape[1] < self.pyramid_min_pixels:
+            return
+        if key in self.pyramids:
+            self.pyramids.move_to_end(key)
+        elif not key in self.pyramid_jobs:
+            job = self.pyramid_pool.submit(self.build_pyramid, key, im)
+            self.pyramid_jobs[key] = job
+            # the signal hands the result over to the Qt thread
+            job.add_done_callback(lambda job: self.pyramidReady.emit(key, job))
+
+    def onpyramidready(self, key, job):
+        if self.pyramid_jobs.get(key) is not job:
+            return
+        del self.pyramid_jobs[key]
+        if job.cancelled():
+            return
+        levels = job.result()
+        # keep only one pyramid per image
+        for other in [k for k in self.pyramids if k[:2] == key[:2]]:
+            del self.pyramids[other]
+        self.pyramids[key] = levels
+        self.evict_pyramids()
+        # forced, the preview shown so far covers the same window at the same level
+        if key == self.get_pyramid_key() and self.render(force=True):
+            self.request_draw()
+
+    def evict_pyramids(self):
+        # drop least recently shown pyramids beyond self.pyramid_bytes, the displayed image's pyramid is always kept
+        current = self.get_pyramid_key()
+        nbytes = sum(sum(level.nbytes for level in levels[1:]) for key, levels in self.pyramids.items() if key != current)
+        for key in [key for key in self.pyramids if key != current]:
+            if nbytes <= self.pyramid_bytes:
+                break
+            nbytes -= sum(level.nbytes for level in self.pyramids.pop(key)[1:])
+
+    def get_level(self):
+        # coarsest resolution level (as built by build_pyramid) that still provides at least one pixel per canvas pixel
+        height, width = self.display_size
+        if height * width < self.pyramid_min_pixels:
+            return 0
+        num_levels = 1 + max(0, int(np.ceil(np.log2(max(height, width) / 512.))))
+        y0, y1, x0, x1 = self.get_viewport()
+        ratio = min((x1 - x0) / max(1., self.ax.bbox.width), (y1 - y0) / max(1., self.ax.bbox.height))
+        return int(np.clip(np.floor(np.log2(max(ratio, 1.))), 0, num_levels - 1))
+
+    def setDownsampleMode(self, mode):
+        downsample(np.zeros((2, 2)), mode=mode) # validate mode
+        self.downsample_mode = mode
+        if not self.display_im is None:
+            self.request_pyramid(self.display_key, self.display_im)
+            self.render(force=True)
+            self.request_draw()
+
+    def render(self, force=False):
+        # tonemap only the visible region (plus margin) of the displayed image at the resolution level matching the canvas
+        view = self.get_viewport()
+        window = self.rendered_window
+        level = self.get_level()
+        if not force and window is not None and level == self.rendered_level:
+            covered = window[0] <= view[0] and window[1] >= view[1] and window[2] <= view[2] and window[3] >= view[3]
+            # re-render when zoomed in far enough to make the rendered window unnecessarily large
+            margin = (1 + 2 * self.viewport_margin) ** 2
+            oversized = (window[1] - window[0]) * (window[3] - window[2]) > 4 * margin * (view[1] - view[0]) * (view[3] - view[2])
+            if covered and not oversized:
+                return False
+        y0, y1, x0, x1 = self.get_viewport(self.viewport_margin)
+        if level == 0:
+            # use the prefetched window if it was prepared for the current display state
+            entry = self.prefetched_tm.pop(self.display_key, None)
+            if not entry is None and entry[0] == (self.offset, self.scale, self.gamma, (y0, y1, x0, x1)):
+                self.ih.set_data(entry[1])
+                self.ih.set_extent((x0 - 0.5, x1 - 0.5, y1 - 0.5, y0 - 0.5))
+                self.rendered_window = (y0, y1, x0, x1)
+                self.rendered_level = 0
+                return True
+        levels = self.pyramids.get(self.get_pyramid_key())
+        # without a pyramid (not built yet) a strided preview of the window is shown until it is ready
+        im = levels[level] if level and not levels is None else self.display_im
+        f = 2 ** level
+        # window in coordinates of the selected level
+        lh, lw = self.display_size[0] // f, self.display_size[1] // f
+        ly0 = min(y0 // f, lh - 1)
+        ly1 = int(np.clip(-(-y1 // f), ly0 + 1, lh))
+        lx0 = min(x0 // f, lw - 1)
+        lx1 = int(np.clip(-(-x1 // f), lx0 + 1, lw))
+        if im is self.display_im and level:
+            # not quantized, the codes of a new view each time would only displace cached ones
+            im = tonemap(im[ly0 * f : ly1 * f : f, lx0 * f : lx1 * f : f], self.offset, self.scale, self.gamma, dtype=np.uint8)
+            self.render_buffer = None
         else:
-            if self.nims > 1:
-                self.uiCBCollageActive.blockSignals(True)
-                self.uiCBCollageActive.setChecked(False)
-                self.uiCBCollageActive.blockSignals(False)
-            height, width = self.ih.get_size()
-            im = self.get_img()
-            if height != im.shape[0] or width != im.shape[1]:
-                # image size changed, create new axes
-                self.ax.clear()
-                self.ih = self.ax.imshow(self.tonemap(im))
-            else:
-                self.ih.set_data(self.tonemap(im))
-            height, width = self.ih.get_size()
+            # the artist copies (matplotlib) or re-wraps (qimage backend) the data, so the buffer can be reused
+            self.render_buffer = self.tonemap(im, (ly0, ly1, lx0, lx1), out=self.render_buffer,
+                                              key=self.get_quantized_key(level))
+            im = self.render_buffer
+        self.ih.set_data(im)
+        self.ih.set_extent((lx0 * f - 0.5, lx1 * f - 0.5, ly1 * f - 0.5, ly0 * f - 0.5))
+        self.rendered_window = (ly0 * f, ly1 * f, lx0 * f, lx1 * f)
+        self.rendered_level = level
+        return True
+
+    def set_display(self, im, key=None):
+        # key: hashable identifier of im, enables building a resolution pyramid in the background
+        self.display_im = im
+        self.display_key = key
+        self.request_pyramid(key, im)
+        if self.display_size != im.shape[:2]:
+            # image size changed, create new axes
+            self.ax.clear()
+            self.ih = self.ax.imshow(np.zeros((1, 1, 3)), origin='upper')
+            self.display_size = im.shape[:2]
+            height, width = self.display_size
             lims = (-0.5, width - 0.5, -0.5, height - 0.5)
             self.ax.set(xlim = lims[0:2], ylim = lims[2:4])
             try:
                 self.ax.get_yaxis().set_inverted(True)
             except Exception:
                 self.ax.invert_yaxis()
-            self.fig.canvas.draw()
+        self.render(force=True)
+
+    def updateImage(self):
+        self.sync_stream()
+        if self.collageActive:
+            self.collage()
+        else:
+            if hasattr(self, 'uiCBCollageActive'):
+                self.uiCBCollageActive.blockSignals(True)
+                self.uiCBCollageActive.setChecked(False)
+                self.uiCBCollageActive.blockSignals(False)
+            key = self.get_img_key()
+            im = self.prefetched_raw.pop(key, None)
+            self.set_display(self.get_img() if im is None else im, key)
+            self.request_draw()
+            self.prefetch()
+
+    def prefetch_img(self, i, key, state):
+        # runs in self.prefetch_pool: load, crop, annotate and tonemap image i ahead of time
+        im = self.get_img(i)
+        if key != self.get_img_key(i):
+            # cropping or annotation changed in the meantime
+            return None
+        tm = None
+        if not state is None and state == (self.offset, self.scale, self.gamma, state[3]) and im.shape[:2] == self.display_size:
+            tm = (state, self.tonemap(im, state[3], key=(key, 0)))
+        return im, tm
+
+    def onprefetchready(self, key, job):
+        if self.prefetch_jobs.get(key) is not job:
+            # out of reach or parameters changed
+            return
+        del self.prefetch_jobs[key]
+        res = None if job.cancelled() else job.result()
+        if res is None:
+            return
+        self.prefetched_raw[key] = res[0]
+        if not res[1] is None:
+            self.prefetched_tm[key] = res[1]
+
+    def prefetch(self):
+        # prepare the neighbouring images of the current one in the current display state
+        keys = []
+        for step in range(1, self.prefetch_count + 1):
+            for i in (self.imind + step, self.imind - step):
+                keys.append((self.get_img_key(int(np.mod(i, self.nims))), int(np.mod(i, self.nims))))
+        wanted = set(key for key, _ in keys)
+        # forget about images that moved out of reach
+        for key in [key for key in self.prefetch_jobs if not key in wanted]:
+            self.prefetch_jobs.pop(key).cancel()
+        for cache in (self.prefetched_raw, self.prefetched_tm):
+            for key in [key for key in cache if not key in wanted]:
+                cache.pop(key, None)
+        state = None
+        if self.rendered_level == 0 and not self.autoscaleOnChange:
+            # tonemapping ahead is pointless when scale and offset change with each image
+            state = (self.offset, self.scale, self.gamma, self.get_viewport(self.viewport_margin))
+        for key, i in keys:
+            if key == self.display_key or key in self.prefetch_jobs:
+                continue
+            if key in self.prefetched_raw and (state is None or key in self.prefetched_tm):
+                continue
+            job = self.prefetch_pool.submit(self.prefetch_img, i, key, state)
+            self.prefetch_jobs[key] = job
+            job.add_done_callback(lambda job, key=key: self.prefetchReady.emit(key, job))
+
+    def cancel_prefetch(self):
+        # tonemapping parameters changed, prefetched tonemapped images became stale
+        jobs = list(self.prefetch_jobs.values())
+        self.prefetch_jobs.clear()
+        for job in jobs:
+            job.cancel()
+        self.prefetched_tm.clear()
     
     def setScale(self, scale, update=True):
         self.scale = scale
+        self.cancel_prefetch()
         self.uiLEScale.setText(str(self.scale))
         if update:
             self.updateImage()
     
     def setGamma(self, gamma, update=True):
         self.gamma = gamma
+        self.cancel_prefetch()
         self.uiLEGamma.setText(str(self.gamma))
         if update:
             self.updateImage()
     
     def setOffset(self, offset, update=True):
         self.offset = offset
+        self.cancel_prefetch()
         self.uiLEOffset.setText(str(self.offset))
         if update:
             self.updateImage()
     
+    def request_draw(self):
+        # coalesce redraws, at most one per frame interval
+        if not self.draw_timer.isActive():
+            self.draw_timer.start(self.frame_interval)
+
+    def draw(self):
+        if self.blit_background is None:
+            self.fig.canvas.draw()
+        else:
+            # panning: only redraw the image on top of the cached background
+            self.fig.canvas.restore_region(self.blit_background)
+            self.ax.draw_artist(self.ih)
+            self.fig.canvas.blit(self.ax.bbox)
+
+    def start_blitting(self):
+        self.draw_timer.stop()
+        self.ih.set_animated(True)
+        self.fig.canvas.draw()
+        self.blit_background = self.fig.canvas.copy_from_bbox(self.ax.bbox)
+        self.draw()
+
+    def stop_blitting(self):
+        if not self.blit_background is None:
+            self.blit_background = None
+            self.ih.set_animated(False)
+            self.request_draw()
+
     def onclick(self, event):
         if event.dblclick:
             self.reset_zoom()
@@ -700,9 +1081,12 @@ class iv(QMainWindow):
             self.cur_xlims = self.ih.axes.axis()[0 : 2]
             self.cur_ylims = self.ih.axes.axis()[2 :]
             self.mouse_down |= event.button
+            if self.mouse_down == 1:
+                self.start_blitting()
             
     def onrelease(self, event):
         self.mouse_down ^= event.button
+        self.stop_blitting()
             
     def onmotion(self, event):
         if self.mouse_down == 1 and event.inaxes:
@@ -712,7 +1096,8 @@ class iv(QMainWindow):
                                self.cur_xlims[1] + delta_x, 
                                self.cur_ylims[0] + delta_y,
                                self.cur_ylims[1] + delta_y))
-            self.fig.canvas.draw()
+            self.render()
+            self.draw()
             self.x_start += (delta_x - self.prev_delta_x)
             self.y_start += (delta_y - self.prev_delta_y)
             self.prev_delta_x = delta_x
@@ -737,6 +1122,11 @@ class iv(QMainWindow):
             # toggle on-change autoscale
             self.autoscaleOnChange = not self.autoscaleOnChange
             print('on-change autoscaling is %s' % ('on' if self.autoscaleOnChange else 'off'))
+        elif key == Qt.Key_D:
+            # toggle how reduced resolutions are computed
+            self.setDownsampleMode('max' if self.downsample_mode == 'mean' else 'mean')
+            print('downsampling mode is %s' % self.downsample_mode)
+            return
         elif key == Qt.Key_G:
             self.gamma = 1.
         elif key == Qt.Key_L:
@@ -758,7 +1148,7 @@ class iv(QMainWindow):
             self.scale = 1.
         elif key == Qt.Key_Z:
             # reset zoom
-            self.ih.axes.autoscale(True)
+            self.reset_zoom()
         elif key == Qt.Key_Alt:
             self.alt = True
             self.uiLabelModifiers.setText('alt: %d, ctrl: %d, shift: %d' % (self.alt, self.control, self.shift))
@@ -802,33 +1192,137 @@ class iv(QMainWindow):
     
     def onscroll(self, event):
         if self.control and self.shift:
+            kind = 'percentile'
+        elif self.control:
+            kind = 'scale'
+        elif self.shift:
+            kind = 'gamma'
+        elif event.inaxes:
+            kind = 'zoom'
+        else:
+            kind = 'image'
+        # accumulate bursts of wheel events and apply them at most once per frame interval
+        if kind != self.scroll_kind:
+            self.apply_scroll()
+        self.scroll_kind = kind
+        self.scroll_steps += event.step
+        self.scroll_pos = [event.xdata, event.ydata]
+        if not self.scroll_timer.isActive():
+            self.scroll_timer.start(self.frame_interval)
+
+    def apply_scroll(self):
+        self.scroll_timer.stop()
+        kind = self.scroll_kind
+        step = self.scroll_steps
+        self.scroll_kind = None
+        self.scroll_steps = 0
+        if kind is None or step == 0:
+            return
+        if kind == 'percentile':
             # autoscale percentiles
-            self.autoscalePrctile *= np.power(1.1, event.step)
+            self.autoscalePrctile *= np.power(1.1, step)
             self.autoscalePrctile = np.minimum(100, self.autoscalePrctile)
             print('auto percentiles: [%3.5f, %3.5f]' % (self.autoscalePrctile, 100 - self.autoscalePrctile))
             self.autoscaleUsePrctiles = True
             self.autoscale()
-        elif self.control:
+        elif kind == 'scale':
             # scale
-            #self.setScale(self.scale * np.power(1.1, event.step))
-            self.setScale(self.scale * np.power(1.1, event.step))
-        elif self.shift:
+            self.setScale(self.scale * np.power(1.1, step))
+        elif kind == 'gamma':
             # gamma
-            self.setGamma(self.gamma * np.power(1.1, event.step))
-        elif event.inaxes:
+            self.setGamma(self.gamma * np.power(1.1, step))
+        elif kind == 'zoom':
             # zoom when inside image axes
-            factor = np.power(self.zoom_factor, -event.step)
-            self.zoom([event.xdata, event.ydata], factor)
-            return
+            factor = np.power(self.zoom_factor, -step)
+            self.zoom(self.scroll_pos, factor)
         else:
             # scroll through images when outside of axes
             self.switch_to_single_image()
-            self.imind = int(np.mod(self.imind - event.step, self.nims))
+            self.imind = int(np.mod(self.imind - step, self.nims))
             print('image %d / %d' % (self.imind + 1, self.nims))
             if self.autoscaleOnChange:
                 self.autoscale()
-                return
-        self.updateImage()
+            else:
+                self.updateImage()
     
+    def get_stream(self, kwargs):
+        # ring buffer for pushed images
+        if isinstance(self.images, FrameRing):
+            return self.images
+        if not isinstance(self.images, list):
+            raise Exception('images can only be pushed to iv instances showing in-memory images')
+        return FrameRing(self.images, max_bytes=kwargs.get('stream_max_bytes', 2 ** 30), max_frames=kwargs.get('stream_max_frames'))
+
+    def push(self, image, copy=True):
+        """append an image, can be called from any thread; the oldest images are dropped beyond the memory limit
+
+        only for viewers opened with stream=True (the controls for multiple images are created only then)
+        """
+        self.check_streaming()
+        # copy by default, producers may reuse their buffers
+        image = np.array(as_image(image)) if copy else as_image(image)
+        if not self.dtype is None:
+            image = image.astype(self.dtype, copy=False)
+        with self.stream_lock:
+            self.images.append(image)
+            notify = not self.stream_dirty
+            self.stream_dirty = True
+        if notify:
+            self.streamUpdated.emit()
+
+    def update(self, index, image, copy=True):
+        """replace image index, can be called from any thread, only for viewers opened with stream=True"""
+        self.check_streaming()
+        image = np.array(as_image(image)) if copy else as_image(image)
+        if not self.dtype is None:
+            image = image.astype(self.dtype, copy=False)
+        with self.stream_lock:
+            self.images[index] = image
+            notify = not self.stream_dirty
+            self.stream_dirty = True
+        if notify:
+            self.streamUpdated.emit()
+
+    def check_streaming(self):
+        if not self.streaming:
+            raise Exception('images can only be pushed to viewers opened with stream=True')
+
+    def sync_stream(self):
+        # runs on the Qt thread: update the number of pushed images and keep showing the same one while older ones
+        # are dropped (or the oldest one left, if it was dropped itself)
+        if not isinstance(self.images, FrameRing):
+            return
+        with self.images.lock:
+            nims = len(self.images.frames)
+            dropped = self.images.dropped
+        self.imind = int(np.clip(self.imind - (dropped - self.stream_dropped), 0, nims - 1))
+        self.nims = nims
+        self.stream_dropped = dropped
+
+    def onstream(self):
+        # runs on the Qt thread, at most once per stream interval
+        with self.stream_lock:
+            self.stream_dirty = False
+        follow = self.imind == self.nims - 1 # keep showing the newest image
+        self.sync_stream()
+        with self.images.lock:
+            ids = set(self.images.ids)
+        with self.crop_lock:
+            self.img_bounds = dict()
+            self.global_bounds = None
+        # the keys of annotated images do not reflect changed global cropping bounds
+        with self.annotated_lock:
+            self.annotated.clear()
+        self.img_stats = {key: val for key, val in self.img_stats.items() if key[2] in ids}
+        self.img_limits = {key: val for key, val in self.img_limits.items() if key[0][2] in ids}
+        for key in [key for key in self.pyramids if key[0] == 'img' and not key[2] in ids]:
+            self.pyramids.pop(key, None)
+        if follow:
+            self.imind = self.nims - 1
+        if self.autoscaleOnChange:
+            self.autoscale()
+        else:
+            self.updateImage()
+
     def save(self, ofname):
-        imageio.imwrite(ofname, np.array(self.ih.get_array()))
\ No newline at end of file
+        imageio.imwrite(ofname, self.tonemap(self.display_im, key=self.get_quantized_key()))
\ No newline at end of file
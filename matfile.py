@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 19:05:22 2026
+
+@author: spl
+
+lazy access to MATLAB .mat files: variables are only read when accessed
+    v5 files: uncompressed numeric arrays are memory-mapped, all other variables are read individually by scipy.io
+    v7.3 files: arrays are returned as MatDataset, which reads from the HDF5 dataset on indexing and has the same
+                (squeezed) shape as the array of a v5 file, structs as MatGroup and strings / cells are converted when
+                accessed
+"""
+
+from collections.abc import Mapping
+import threading
+
+import numpy as np
+import scipy.io as spio
+
+from pytb.utils import to_dict
+
+# MAT v5 data types (miINT8, ...) and array classes (mxDOUBLE_CLASS, ...) that can be memory-mapped
+mi_dtypes = {1: 'i1', 2: 'u1', 3: 'i2', 4: 'u2', 5: 'i4', 6: 'u4', 7: 'f4', 9: 'f8', 12: 'i8', 13: 'u8'}
+mx_dtypes = {6: 'f8', 7: 'f4', 8: 'i1', 9: 'u1', 10: 'i2', 11: 'u2', 12: 'i4', 13: 'u4', 14: 'i8', 15: 'u8'}
+miMATRIX = 14
+hdf5_signature = b'\x89HDF\r\n\x1a\n'
+
+def is_hdf5(filename):
+    # v7.3 files are HDF5 files with a 512 byte user block holding the MATLAB header
+    with open(filename, 'rb') as f:
+        f.seek(512)
+        return f.read(8) == hdf5_signature
+
+def read_tag(buf, p, endian):
+    """(data type, number of bytes, start of data, start of next element) of the data element at p"""
+    word = int(np.frombuffer(buf, endian + 'u4', 1, p)[0])
+    if word >> 16:
+        # small data element, data is packed into the tag
+        return word & 0xffff, word >> 16, p + 4, p + 8
+    nbytes = int(np.frombuffer(buf, endian + 'u4', 1, p + 4)[0])
+    return word, nbytes, p + 8, p + 8 + (nbytes + 7) // 8 * 8
+
+def scan_v5(filename):
+    """locations of all memory-mappable variables of a v5 file: name -> (dtype, shape, offset)"""
+    entries = dict()
+    with open(filename, 'rb') as f:
+        header = f.read(128)
+        endian = '<' if header[126:128] == b'IM' else '>'
+        size = f.seek(0, 2)
+        pos = 128
+        while pos + 8 <= size:
+            f.seek(pos)
+            mtype, nbytes = np.frombuffer(f.read(8), endian + 'u4')
+            mtype, nbytes = int(mtype), int(nbytes)
+            if mtype == miMATRIX:
+                # array flags, dimensions, name and the tag of the real part fit into the first few kB
+                buf = f.read(min(nbytes, 4096))
+                try:
+                    entry = parse_matrix_header(buf, endian)
+                except (IndexError, ValueError):
+                    entry = None
+                if not entry is None:
+                    name, dtype, shape, start = entry
+                    entries[name] = (dtype, shape, pos + 8 + start)
+            pos += 8 + nbytes
+    return entries
+
+def parse_matrix_header(buf, endian):
+    # array flags: class in the lowest byte, complex / global / logical flags above (logical arrays are uint8, as
+    # returned by scipy.io.loadmat)
+    _, _, start, p = read_tag(buf, 0, endian)
+    flags = int(np.frombuffer(buf, endian + 'u4', 1, start)[0])
+    mx_class = flags & 0xff
+    is_complex = flags & 0x800
+    _, nbytes, start, p = read_tag(buf, p, endian)
+    shape = tuple(int(d) for d in np.frombuffer(buf, endian + 'i4', nbytes // 4, start))
+    _, nbytes, start, p = read_tag(buf, p, endian)
+    name = bytes(buf[start : start + nbytes]).decode('ascii')
+    if is_complex or not mx_class in mx_dtypes:
+        return None
+    mtype, nbytes, start, _ = read_tag(buf, p, endian)
+    # MATLAB stores e.g. integer-valued doubles in smaller types, these need conversion and are not mapped
+    if mi_dtypes.get(mtype) != mx_dtypes[mx_class] or start == p + 4 or nbytes == 0:
+        return None
+    dtype = np.dtype(endian + mx_dtypes[mx_class])
+    if nbytes != dtype.itemsize * int(np.prod(shape)):
+        return None
+    return name, dtype, shape, start
+
+def squeeze(val):
+    # as scipy.io.loadmat with squeeze_me=True
+    if isinstance(val, np.ndarray):
+        val = np.squeeze(val)
+        if val.ndim == 0 and val.dtype.isbuiltin:
+            return val.item()
+    return val
+
+class MatFile(Mapping):
+    """read-only dict-like view of a .mat file, each variable is read (or mapped) once on first access"""
+    def __init__(self, filename, variable_names=None):
+        self.filename = filename
+        self.h5 = None
+        self.cache = dict()
+        self.lock = threading.Lock()
+        if is_hdf5(filename):
+            import h5py
+            self.h5 = h5py.File(filename, 'r')
+            self.root = MatGroup(self.h5)
+            names = list(self.root)
+        else:
+            self.entries = scan_v5(filename)
+            names = [name for name, _, _ in spio.whosmat(filename)]
+        if not variable_names is None:
+            names = [name for name in names if name in variable_names]
+        self.names = names
+
+    def __getitem__(self, name):
+        if not name in self.names:
+            raise KeyError(name)
+        with self.lock:
+            if not name in self.cache:
+                self.cache[name] = self.read(name)
+            return self.cache[name]
+
+    def read(self, name):
+        if not self.h5 is None:
+            return self.root[name]
+        if name in self.entries:
+            dtype, shape, offset = self.entries[name]
+            return squeeze(np.memmap(self.filename, dtype, 'r', offset, shape, order='F'))
+        val = spio.loadmat(self.filename, variable_names=[name], struct_as_record=False, squeeze_me=True)[name]
+        if isinstance(val, spio.matlab.mat_struct):
+            val = to_dict(val)
+        return val
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def close(self):
+        if not self.h5 is None:
+            self.h5.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+class MatGroup(Mapping):
+    """dict-like view of a v7.3 struct (or the file's root group)"""
+    def __init__(self, group):
+        self.group = group
+
+    def __getitem__(self, name):
+        return convert_h5(self.group[name])
+
+    def __iter__(self):
+        # '#refs#' and '#subsystem#' hold MATLAB internals
+        return (name for name in self.group if not name.startswith('#'))
+
+    def __len__(self):
+        return len(list(iter(self)))
+
+class MatDataset(object):
+    """array of a v7.3 file in MATLAB's axis order with singleton dimensions squeezed, as loaded from v5 files
+
+    HDF5 stores MATLAB's column-major arrays with reversed dimensions, indexing reads only the selected part
+    """
+    def __init__(self, dataset):
+        self.dataset = dataset
+        self.full_shape = dataset.shape[::-1]
+        self.axes = [d for d, n in enumerate(self.full_shape) if n != 1] # axes kept by squeezing
+        self.shape = tuple(self.full_shape[d] for d in self.axes)
+        self.ndim = len(self.shape)
+        self.dtype = dataset.dtype
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            index = (index,)
+        ellipsis = [i for i, ind in enumerate(index) if ind is Ellipsis]
+        if ellipsis:
+            i = ellipsis[0]
+            index = index[:i] + (slice(None),) * (self.ndim - len(index) + 1) + index[i + 1:]
+        index = index + (slice(None),) * (self.ndim - len(index))
+        # squeezed axes are indexed by 0, the order of axes is reversed for HDF5
+        full_index = [0] * len(self.full_shape)
+        for d, ind in zip(self.axes, index):
+            full_index[d] = ind
+        return np.transpose(self.dataset[tuple(full_index[::-1])])
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self[()], dtype=dtype)
+
+def convert_h5(obj):
+    import h5py
+    if isinstance(obj, h5py.Group):
+        return MatGroup(obj)
+    matlab_class = obj.attrs.get('MATLAB_class', b'')
+    if isinstance(matlab_class, bytes):
+        matlab_class = matlab_class.decode('ascii')
+    if matlab_class == 'char':
+        return ''.join(chr(c) for c in obj[()].flatten(order='F')) if obj.attrs.get('MATLAB_empty', 0) == 0 else ''
+    if matlab_class == 'cell':
+        # references are stored with reversed dimensions as arrays, filled one by one as numpy would otherwise
+        # try to broadcast array-like cells
+        refs = obj[()]
+        cells = np.empty(refs.shape, dtype=object)
+        for index, ref in np.ndenumerate(refs):
+            cells[index] = convert_h5(obj.file[ref])
+        return squeeze(cells.T)
+    res = MatDataset(obj)
+    # scalars are returned as such, as by scipy.io.loadmat with squeeze_me=True
+    return res[()].item() if res.ndim == 0 else res
+
+def to_memory(val):
+    """read all arrays of a (nested) variable of a MatFile"""
+    if isinstance(val, Mapping):
+        return {key: to_memory(v) for key, v in val.items()}
+    if isinstance(val, MatDataset):
+        return np.asarray(val)
+    if isinstance(val, np.ndarray) and val.dtype == object:
+        res = np.empty(val.shape, dtype=object)
+        for index, v in np.ndenumerate(val):
+            res[index] = to_memory(v)
+        return res
+    return val
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 15:31:48 2026
+
+@author: spl
+
+lightweight replacement for iv's matplotlib canvas: tonemapped images are wrapped in QImages without copying and
+drawn with QPainter transforms for panning / zooming, no figure re-rendering or Agg resampling involved
+
+only the part of the matplotlib API used by iv is implemented (figure, canvas and axes are merged into ImageCanvas)
+"""
+
+import types
+
+import numpy as np
+
+from PyQt5.QtCore import QRectF, QSize, Qt
+from PyQt5.QtGui import QColor, QImage, QPainter, QTransform
+from PyQt5.QtWidgets import QWidget
+
+class ImageArtist(object):
+    """counterpart of matplotlib's AxesImage"""
+    def __init__(self, axes, data):
+        self.axes = axes
+        self.animated = False
+        self.qimage = None
+        self.set_data(data)
+        self.extent = (-0.5, self.data.shape[1] - 0.5, self.data.shape[0] - 0.5, -0.5)
+
+    def set_data(self, data):
+        data = np.atleast_3d(data)
+        if data.dtype != np.uint8:
+            data = np.rint(255 * np.clip(data, 0., 1.)).astype(np.uint8)
+        # QImage refers to the array's buffer, which hence needs to stay alive and contiguous
+        self.data = np.ascontiguousarray(data)
+        height, width, channels = self.data.shape
+        fmt = QImage.Format_RGBA8888 if channels == 4 else QImage.Format_RGB888
+        self.qimage = QImage(self.data.data, width, height, channels * width, fmt)
+
+    def get_array(self):
+        return self.data
+
+    def get_size(self):
+        return self.data.shape[:2]
+
+    def set_extent(self, extent):
+        self.extent = tuple(extent)
+
+    def get_extent(self):
+        return list(self.extent)
+
+    def set_animated(self, animated):
+        self.animated = animated
+
+    def get_animated(self):
+        return self.animated
+
+class ImageCanvas(QWidget):
+    """widget showing a single image, acting as figure, canvas and axes for iv"""
+    def __init__(self, parent=None):
+        super(ImageCanvas, self).__init__(parent)
+        self.canvas = self # iv accesses the canvas via fig.canvas
+        self.callbacks = dict() # matplotlib event name -> list of callbacks
+        self.image = None
+        self.xlim = (-0.5, 0.5)
+        self.ylim = (0.5, -0.5) # (bottom, top) as in matplotlib, i.e. inverted for images
+        self.setMouseTracking(True)
+        self.bbox = types.SimpleNamespace(width=1., height=1.)
+
+    # matplotlib axes API
+    def imshow(self, data, **kwargs):
+        self.image = ImageArtist(self, data)
+        self.update()
+        return self.image
+
+    def clear(self):
+        self.image = None
+
+    def get_xlim(self):
+        return self.xlim
+
+    def get_ylim(self):
+        return self.ylim
+
+    def axis(self, lims=None):
+        if not lims is None:
+            self.xlim = (lims[0], lims[1])
+            self.ylim = (lims[2], lims[3])
+        return self.xlim + self.ylim
+
+    def set(self, xlim=None, ylim=None):
+        if not xlim is None:
+            self.xlim = tuple(xlim)
+        if not ylim is None:
+            self.ylim = tuple(ylim)
+
+    def get_yaxis(self):
+        return self
+
+    def set_inverted(self, inverted):
+        if inverted != (self.ylim[0] > self.ylim[1]):
+            self.invert_yaxis()
+
+    def invert_yaxis(self):
+        self.ylim = (self.ylim[1], self.ylim[0])
+
+    def set_position(self, pos):
+        pass
+
+    def set_anchor(self, anchor):
+        pass
+
+    def set_xticks(self, ticks):
+        pass
+
+    def set_yticks(self, ticks):
+        pass
+
+    def draw_artist(self, artist):
+        pass
+
+    # matplotlib canvas API
+    def mpl_connect(self, name, callback):
+        self.callbacks.setdefault(name, []).append(callback)
+        return len(self.callbacks[name])
+
+    def draw(self):
+        self.update()
+
+    def draw_idle(self):
+        self.update()
+
+    def copy_from_bbox(self, bbox):
+        return None
+
+    def restore_region(self, region):
+        pass
+
+    def blit(self, bbox=None):
+        self.update()
+
+    # rendering
+    def get_transform(self):
+        # data -> widget coordinates, equal aspect ratio anchored at the top left as iv's matplotlib axes
+        dx = self.xlim[1] - self.xlim[0]
+        dy = self.ylim[0] - self.ylim[1]
+        # before the widget is laid out (size 0), assume its preferred size
+        width = self.width() or self.sizeHint().width()
+        height = self.height() or self.sizeHint().height()
+        scale = min(width / abs(dx), height / abs(dy))
+        sx = scale * np.sign(dx)
+        sy = scale * np.sign(dy)
+        self.bbox.width = abs(dx) * scale
+        self.bbox.height = abs(dy) * scale
+        return QTransform(sx, 0., 0., sy, -self.xlim[0] * sx, -self.ylim[1] * sy)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(255, 255, 255))
+        transform = self.get_transform()
+        if self.image is None:
+            return
+        painter.setClipRect(QRectF(0., 0., self.bbox.width, self.bbox.height))
+        painter.setTransform(transform)
+        left, right, bottom, top = self.image.extent
+        # nearest neighbour when magnifying (as iv's pixel inspection expects), smooth when minifying
+        if abs(transform.m11()) * (right - left) < self.image.data.shape[1]:
+            painter.setRenderHint(QPainter.SmoothPixmapTransform)
+        painter.drawImage(QRectF(left, top, right - left, bottom - top), self.image.qimage)
+
+    def sizeHint(self):
+        # QWidget's default is invalid, the canvas would start out with no size at all
+        return QSize(640, 480)
+
+    def resizeEvent(self, event):
+        self.get_transform()
+        super(ImageCanvas, self).resizeEvent(event)
+
+    # events
+    def make_event(self, pos, **kwargs):
+        inverse, _ = self.get_transform().inverted()
+        point = inverse.map(pos)
+        inaxes = 0 <= pos.x() <= self.bbox.width and 0 <= pos.y() <= self.bbox.height
+        return types.SimpleNamespace(xdata=point.x() if inaxes else None, ydata=point.y() if inaxes else None,
+                                     inaxes=self if inaxes else None, **kwargs)
+
+    def emit(self, name, event):
+        for callback in self.callbacks.get(name, []):
+            callback(event)
+
+    def mouse_button(self, event):
+        return {Qt.LeftButton: 1, Qt.MidButton: 2, Qt.RightButton: 3}.get(event.button(), 0)
+
+    def mousePressEvent(self, event):
+        self.emit('button_press_event', self.make_event(event.localPos(), button=self.mouse_button(event), dblclick=False))
+
+    def mouseDoubleClickEvent(self, event):
+        self.emit('button_press_event', self.make_event(event.localPos(), button=self.mouse_button(event), dblclick=True))
+
+    def mouseReleaseEvent(self, event):
+        self.emit('button_release_event', self.make_event(event.localPos(), button=self.mouse_button(event), dblclick=False))
+
+    def mouseMoveEvent(self, event):
+        self.emit('motion_notify_event', self.make_event(event.localPos(), button=None, dblclick=False))
+
+    def wheelEvent(self, event):
+        self.emit('scroll_event', self.make_event(event.posF(), step=event.angleDelta().y() / 120., button=None))
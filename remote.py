@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 14:05:21 2026
+
+@author: spl
+
+iv running in a separate process: images are written to shared memory and only their metadata is sent through a pipe,
+so that pushing images neither blocks the producer on rendering nor competes with it for the GIL
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+import threading
+
+import numpy as np
+
+def create_shared(nbytes):
+    # the viewer process takes ownership of the segment, it must not be unlinked when this process exits
+    try:
+        return shared_memory.SharedMemory(create=True, size=max(1, nbytes), track=False)
+    except TypeError:
+        # python < 3.13
+        shm = shared_memory.SharedMemory(create=True, size=max(1, nbytes))
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+def unlink_shared(name):
+    # remove a segment that no process has attached
+    try:
+        shm = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # python < 3.13, unlink() unregisters it from the resource tracker again
+        shm = shared_memory.SharedMemory(name=name)
+    shm.unlink()
+    shm.close()
+
+class remote_iv(object):
+    """client of an iv in a separate process, push() / update() return as soon as the image is in shared memory"""
+    def __init__(self, **kwargs):
+        # fork is not safe with Qt (and CUDA) in the producer process
+        ctx = multiprocessing.get_context('spawn')
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=serve, args=(child_conn, kwargs), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.closed = False
+        self.pending = set() # names of segments sent but not yet attached (and unlinked) by the viewer
+
+    def send(self, command, index, image):
+        if self.closed:
+            return
+        if hasattr(image, 'detach'):
+            # torch.Tensor
+            image = image.detach().cpu().numpy()
+        image = np.asarray(image)
+        shm = create_shared(image.nbytes)
+        np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+        self.pending.add(shm.name)
+        shm.close()
+        try:
+            self.conn.send((command, index, shm.name, image.shape, image.dtype.str))
+            self.receive_acks()
+        except (BrokenPipeError, OSError):
+            # viewer window was closed
+            self.closed = True
+            self.unlink_pending()
+
+    def receive_acks(self, block=False):
+        # the viewer sends back the name of each segment it attached
+        try:
+            while block or self.conn.poll():
+                self.pending.discard(self.conn.recv())
+        except (EOFError, OSError):
+            pass
+
+    def unlink_pending(self):
+        # segments that were still in the pipe when the viewer exited would stay in shared memory until reboot
+        self.receive_acks(block=True)
+        for name in self.pending:
+            try:
+                unlink_shared(name)
+            except FileNotFoundError:
+                pass
+        self.pending.clear()
+
+    def push(self, image):
+        self.send('push', None, image)
+
+    def update(self, index, image):
+        self.send('update', index, image)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            try:
+                self.conn.send(('close', None, None, None, None))
+            except (BrokenPipeError, OSError):
+                pass
+            # returns once the viewer exited
+            self.unlink_pending()
+        self.process.join()
+
+def attach(name, shape, dtype, segments, convert=None):
+    shm = shared_memory.SharedMemory(name=name)
+    # the mapping stays valid after unlinking, this only removes the name
+    shm.unlink()
+    # 3D already, so that iv keeps this very array (and passes it back on eviction)
+    image = np.atleast_3d(np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf))
+    if not convert is None and image.dtype != np.dtype(convert):
+        # iv keeps a converted copy (its dtype option), the shared memory is not needed beyond it
+        converted = image.astype(convert)
+        del image
+        shm.close()
+        return converted
+    segments[id(image)] = (shm, image)
+    return image
+
+def serve(conn, kwargs):
+    # runs in the viewer process
+    from PyQt5 import QtCore
+    from PyQt5.QtWidgets import QApplication
+    from pytb.iv import iv
+
+    segments = dict() # id(image) -> (shared memory, image) of all images shown or in use
+    released = [] # shared memory of images dropped by iv, closed once nothing refers to them anymore
+
+    def release(image):
+        entry = segments.pop(id(image), None)
+        if not entry is None:
+            released.append(entry[0])
+
+    def close_released():
+        for shm in list(released):
+            try:
+                shm.close()
+                released.remove(shm)
+            except BufferError:
+                # image still referenced, e.g. currently displayed
+                pass
+
+    command, index, name, shape, dtype = conn.recv()
+    if command == 'close':
+        return
+    app = QApplication([''])
+    image = attach(name, shape, dtype, segments, kwargs.get('dtype'))
+    conn.send(name)
+    viewer = iv(image, stream=True, **kwargs)
+    viewer.images.on_evict = release
+    timer = QtCore.QTimer()
+    timer.timeout.connect(close_released)
+    timer.start(1000)
+
+    def receive():
+        while True:
+            try:
+                command, index, name, shape, dtype = conn.recv()
+            except EOFError:
+                break
+            if command == 'close':
+                break
+            image = attach(name, shape, dtype, segments, kwargs.get('dtype'))
+            try:
+                conn.send(name)
+            except (BrokenPipeError, OSError):
+                break
+            if command == 'push':
+                viewer.push(image, copy=False)
+            else:
+                viewer.update(index, image, copy=False)
+        QtCore.QMetaObject.invokeMethod(app, 'quit', QtCore.Qt.QueuedConnection)
+
+    threading.Thread(target=receive, daemon=True).start()
+    app.exec_()
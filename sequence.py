@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Created on Sat Oct 17 09:12:40 2026
+
+@author: spl
+"""
+
+from collections import OrderedDict, deque
+import threading
+
+import numpy as np
+
+class ImageSequence(object):
+    """list-like sequence of images that are loaded on demand and kept in an LRU cache bounded in bytes"""
+    def __init__(self, loader, length, cache_bytes=2 ** 30, prepare=None):
+        self.loader = loader # index -> image
+        self.length = length
+        self.cache_bytes = cache_bytes
+        self.prepare = prepare # applied to each loaded image before caching
+        self.cache = OrderedDict()
+        self.cached_bytes = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        for i in range(self.length):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self.length))]
+        i = int(i)
+        if i < 0:
+            i += self.length
+        if i < 0 or i >= self.length:
+            raise IndexError('image index out of range')
+        with self.lock:
+            if i in self.cache:
+                self.cache.move_to_end(i)
+                return self.cache[i]
+        # load outside of the lock so that several images can be loaded concurrently
+        im = self.loader(i)
+        if not self.prepare is None:
+            im = self.prepare(im)
+        with self.lock:
+            if not i in self.cache:
+                self.cache[i] = im
+                self.cached_bytes += im.nbytes
+                # evict least recently used images, but always keep the current one
+                while self.cached_bytes > self.cache_bytes and len(self.cache) > 1:
+                    _, evicted = self.cache.popitem(last=False)
+                    self.cached_bytes -= evicted.nbytes
+            return self.cache[i]
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+            self.cached_bytes = 0
+
+class FrameRing(object):
+    """thread-safe list of images bounded by max_bytes / max_frames, appending beyond that drops the oldest images"""
+    def __init__(self, images=(), max_bytes=2 ** 30, max_frames=None, on_evict=None):
+        self.max_bytes = max_bytes
+        self.max_frames = max_frames
+        self.on_evict = on_evict # called with each image that is dropped or replaced
+        self.frames = deque()
+        self.ids = deque() # unique id per stored image, changes when an image is replaced
+        self.next_id = 0
+        self.nbytes = 0
+        self.dropped = 0 # number of images dropped from the front so far, i.e. by how much indices shifted
+        self.lock = threading.Lock()
+        for image in images:
+            self.append(image)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        with self.lock:
+            frames = list(self.frames)
+        return iter(frames)
+
+    def __getitem__(self, i):
+        with self.lock:
+            if isinstance(i, slice):
+                return list(self.frames)[i]
+            return self.frames[i]
+
+    def __setitem__(self, i, image):
+        with self.lock:
+            self.nbytes += image.nbytes - self.frames[i].nbytes
+            if not self.on_evict is None:
+                self.on_evict(self.frames[i])
+            self.frames[i] = image
+            self.ids[i] = self.next_id
+            self.next_id += 1
+            self.evict()
+
+    def append(self, image):
+        with self.lock:
+            self.frames.append(image)
+            self.ids.append(self.next_id)
+            self.next_id += 1
+            self.nbytes += image.nbytes
+            self.evict()
+
+    def evict(self):
+        # drop the oldest images, but always keep the newest one
+        while len(self.frames) > 1 and (self.nbytes > self.max_bytes or (not self.max_frames is None and len(self.frames) > self.max_frames)):
+            evicted = self.frames.popleft()
+            self.nbytes -= evicted.nbytes
+            self.ids.popleft()
+            self.dropped += 1
+            if not self.on_evict is None:
+                self.on_evict(evicted)
+
+    def get(self, i):
+        """image i, or the newest image if i is beyond the images left after dropping some"""
+        with self.lock:
+            return self.frames[min(i, len(self.frames) - 1)]
+
+    def frame_id(self, i):
+        # clamped as get()
+        with self.lock:
+            return self.ids[min(i, len(self.ids) - 1)]
+
+def load_image(fname):
+    if fname.endswith('.npy'):
+        return np.load(fname)
+    import imageio
+    return imageio.imread(fname)
+
+def is_lazy_source(source):
+    """whether image_sequence() knows how to wrap source"""
+    if isinstance(source, (ImageSequence, str, np.memmap)) or callable(source):
+        return True
+    if isinstance(source, (list, tuple)):
+        return len(source) > 0 and all(isinstance(s, str) for s in source)
+    # h5py datasets and similar array-likes that are read on indexing
+    return not isinstance(source, np.ndarray) and hasattr(source, 'shape') and hasattr(source, 'dtype') \
+        and hasattr(source, '__getitem__') and type(source).__module__.startswith('h5py')
+
+def image_sequence(source, nims=None, axis=-1, cache_bytes=2 ** 30, prepare=np.atleast_3d):
+    """wrap lazy image sources in an ImageSequence
+
+    source can be
+        a path (or list of paths) to image files or .npy files, .npy files are memory-mapped
+        a memory-mapped or HDF5 array, 4D arrays are sliced along axis (default: last axis as in iv, use axis=0 for
+        (N, H, W, C) arrays to read each image contiguously), others are a single image
+        a callable index -> image, the number of images must then be given by nims
+    """
+    if isinstance(source, ImageSequence):
+        return source
+    if isinstance(source, str):
+        if source.endswith('.npy'):
+            source = np.load(source, mmap_mode='r')
+        else:
+            source = [source]
+    if isinstance(source, (list, tuple)):
+        fnames = list(source)
+        return ImageSequence(lambda i: load_image(fnames[i]), len(fnames), cache_bytes, prepare)
+    if callable(source) and not hasattr(source, 'shape'):
+        if nims is None:
+            raise Exception('number of images (nims) must be given for callable image sources')
+        return ImageSequence(source, nims, cache_bytes, prepare)
+    if len(source.shape) < 4:
+        # a single (H, W) or (H, W, C) image
+        return ImageSequence(lambda i: np.array(source), 1, cache_bytes, prepare)
+    axis = axis % len(source.shape)
+    index = (slice(None),) * axis
+    # copy each slice so that only cached images occupy memory
+    return ImageSequence(lambda i: np.array(source[index + (i,)]), source.shape[axis], cache_bytes, prepare)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 11:03:52 2026
+
+@author: spl
+"""
+
+import numpy as np
+import pytest
+import scipy.io as spio
+
+from pytb.matfile import MatFile, parse_matrix_header, read_tag, scan_v5, to_memory
+
+variables = {'a': np.arange(12.).reshape((3, 4)), 'b': np.arange(-20, 20, dtype=np.int16).reshape((2, 4, 5)),
+             'c': np.arange(30, dtype=np.float32).reshape((1, 30)), 'd': np.arange(16).reshape((4, 4)) % 3 == 0,
+             'e': np.arange(4.) + 1j, 's': 'text', 'x': 3.}
+
+def cell(rows):
+    res = np.empty((len(rows), len(rows[0])), dtype=object)
+    for i, row in enumerate(rows):
+        for j, v in enumerate(row):
+            res[i, j] = v
+    return res
+
+def assert_same(val, ref):
+    if isinstance(ref, np.ndarray) and ref.dtype == object:
+        assert val.shape == ref.shape
+        for index, v in np.ndenumerate(ref):
+            assert_same(val[index], v)
+    elif isinstance(ref, np.ndarray):
+        val = np.asarray(val)
+        assert val.shape == ref.shape and val.dtype == ref.dtype
+        assert np.array_equal(val, ref)
+    else:
+        assert val == ref
+
+def test_scan_v5(tmp_path):
+    filename = str(tmp_path / 'test.mat')
+    spio.savemat(filename, variables)
+    entries = scan_v5(filename)
+    # complex arrays and strings packed into small data elements are read by scipy
+    assert sorted(entries) == ['a', 'b', 'c', 'd', 'x']
+    assert entries['a'][1:2] == ((3, 4),) and entries['b'][:2] == (np.dtype('<i2'), (2, 4, 5))
+    assert entries['d'][0] == np.dtype('u1')
+    with open(filename, 'rb') as f:
+        buf = f.read()
+    _, _, start, _ = read_tag(buf, 128, '<')
+    name, dtype, shape, offset = parse_matrix_header(buf[start:], '<')
+    assert (name, dtype, shape) == ('a', np.dtype('<f8'), (3, 4))
+    assert np.array_equal(np.frombuffer(buf, dtype, 12, start + offset).reshape(shape, order='F'), variables['a'])
+
+@pytest.mark.parametrize('do_compression', [False, True])
+def test_mat_file_v5(tmp_path, do_compression):
+    filename = str(tmp_path / 'test.mat')
+    spio.savemat(filename, variables, do_compression=do_compression)
+    ref = spio.loadmat(filename, squeeze_me=True)
+    with MatFile(filename) as f:
+        assert sorted(f) == sorted(variables)
+        for name in variables:
+            assert_same(f[name], ref[name])
+
+def write_h5(group, name, val):
+    import h5py
+    if isinstance(val, np.ndarray) and val.dtype == object:
+        # cells reference their elements in '#refs#', HDF5 dimensions are reversed
+        refs = np.empty(val.shape[::-1], dtype=h5py.ref_dtype)
+        for index, v in np.ndenumerate(val):
+            refs[index[::-1]] = write_h5(group.file.require_group('#refs#'), '%s_%d' % (name, len(group.file['#refs#'])), v)
+        dataset = group.create_dataset(name, data=refs)
+        dataset.attrs['MATLAB_class'] = np.bytes_('cell')
+    elif isinstance(val, str):
+        dataset = group.create_dataset(name, data=np.array([[ord(c)] for c in val], dtype=np.uint16))
+        dataset.attrs['MATLAB_class'] = np.bytes_('char')
+    else:
+        val = np.asarray(val)
+        dataset = group.create_dataset(name, data=np.atleast_2d(val.astype(np.uint8) if val.dtype == bool else val).T)
+        dataset.attrs['MATLAB_class'] = np.bytes_({'?': 'logical', 'h': 'int16', 'f': 'single'}.get(val.dtype.char, 'double'))
+    return dataset.ref
+
+def write_v73(filename, variables):
+    # v7.3 files are HDF5 files with a 512 byte user block for the MATLAB header
+    h5py = pytest.importorskip('h5py')
+    with h5py.File(filename, 'w', userblock_size=512) as f:
+        for name, val in variables.items():
+            write_h5(f, name, val)
+    with open(filename, 'r+b') as f:
+        f.write(b'MATLAB 7.3 MAT-file'.ljust(128))
+
+def test_mat_file_v73(tmp_path):
+    v5 = str(tmp_path / 'v5.mat')
+    v73 = str(tmp_path / 'v73.mat')
+    cells = {'cell': cell([[1., 2., 3.], [4., 5., 6.]]), 'nested': cell([['abc', np.arange(5.)]])}
+    real = {name: val for name, val in variables.items() if name != 'e'}
+    spio.savemat(v5, dict(real, **cells))
+    write_v73(v73, dict(real, **cells))
+    ref = spio.loadmat(v5, squeeze_me=True)
+    with MatFile(v73) as f:
+        assert sorted(f) == sorted(name for name in ref if not name.startswith('__'))
+        for name in f:
+            assert_same(to_memory(f[name]), ref[name])
+        assert f['cell'][0, 2] == 3. and f['cell'][1, 0] == 4.
+
+def test_mat_dataset_indexing(tmp_path):
+    filename = str(tmp_path / 'test.mat')
+    val = np.arange(60.).reshape((4, 1, 3, 5))
+    write_v73(filename, {'v': val})
+    ref = np.squeeze(val)
+    with MatFile(filename) as f:
+        res = f['v']
+        assert res.shape == ref.shape and len(res) == len(ref)
+        for index in [(), 1, (slice(None), 2), (Ellipsis, 3), (1, Ellipsis), (slice(1, 3), 0, slice(None, None, 2)),
+                      (-1, slice(None), 4)]:
+            assert np.array_equal(res[index], ref[index])
+        assert np.array_equal(np.asarray(res), ref)
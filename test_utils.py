@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+"""
+Created on Sun Oct 18 10:12:37 2026
+
+@author: spl
+"""
+
+import numpy as np
+
+from pytb.utils import collage, pad, quantize, tonemap
+
+def test_quantize_float16():
+    image = np.linspace(0., 1., 1000, dtype=np.float16).reshape((10, 100, 1))
+    codes, lo, step = quantize(image)
+    assert codes.max() == 2 ** 16 - 1
+    assert np.abs(lo + codes * step - image.astype(np.float64)).max() <= step
+    res = tonemap(image, 0., 1., 1., quantized=(codes, lo, step), dtype=np.uint8)
+    ref = tonemap(image, 0., 1., 1., dtype=np.uint8)
+    assert np.abs(res.astype(int) - ref).max() <= 1
+
+def test_quantize_non_finite():
+    image = np.linspace(0., 1., 300).reshape((10, 30, 1))
+    image[0, 0] = np.nan
+    image[0, 1] = np.inf
+    image[0, 2] = -np.inf
+    codes, lo, step = quantize(image)
+    assert lo == image[0, 3, 0] and np.isclose(lo + codes.max() * step, 1.)
+    assert codes[0, 0] == 0 and codes[0, 1] == 2 ** 16 - 1 and codes[0, 2] == 0
+    assert np.abs(lo + codes[1:] * step - image[1:]).max() <= step
+
+def test_fill_value_promotion():
+    image = np.full((2, 3, 1), 7, dtype=np.uint8)
+    for value, dtype in [(300, np.uint16), (-1, np.int16), (0.5, np.float16), (255, np.uint8), (0., np.uint8)]:
+        res = pad(image, 4, 4, value=value)
+        assert res.dtype == dtype and res[0, 0, 0] == value and res[1, 0, 0] == 7
+        res = collage([image, image], bw=1, bv=value)
+        assert res.dtype == dtype and res[-1, -1, 0] == value
+    assert np.isnan(collage([image], bw=1, bv=np.nan)[-1, -1, 0])
@@ -6,109 +6,412 @@ Created on Wed Jan 14 23:01:57 2020
 @author: spl
 """
 
+import functools
 import numpy as np
 import re
 import scipy.io as spio
 
-def annotate_image(image, label, font_path=None, font_size=16, font_color=[1., 1., 1.]):
-    from PIL import Image
+@functools.lru_cache(maxsize=None)
+def get_font(font_path, font_size):
     from PIL import ImageFont
+    return ImageFont.truetype(font_path, font_size)
+
+@functools.lru_cache(maxsize=1024)
+def render_label(label, font_path, font_size):
+    """alpha mask of a text label in [0, 1], only as large as the text's bounding box"""
+    from PIL import Image
     from PIL import ImageDraw
 
+    font = get_font(font_path, font_size)
+    _, _, right, bottom = font.getbbox(label)
+    mask = Image.new('L', (max(1, right), max(1, bottom)))
+    ImageDraw.Draw(mask).text((0, 0), label, 255, font=font)
+    mask = np.array(mask, dtype=np.float32) / 255.
+    mask.setflags(write=False) # shared between all calls
+    return mask
+
+def annotate_image(image, label, font_path=None, font_size=16, font_color=[1., 1., 1.]):
+    return annotate_images([image], [label], font_path, font_size, font_color)[0]
+
+def annotate_images(images, labels, font_path=None, font_size=16, font_color=[1., 1., 1.]):
+    """write labels into the top left corners of copies of images (list or 4D array with images along the last axis)"""
     if font_path is None:
         font_path = '/usr/share/fonts/truetype/dejavu/DejaVuSansMono.ttf'
 
-    mask = Image.fromarray(np.zeros(image.shape, dtype=np.uint8))
-    draw = ImageDraw.Draw(mask)
-    font = ImageFont.truetype(font_path, font_size)
-    draw.text((0, 0), label, (255, 255, 255), font=font)
-    mask = np.atleast_3d(np.array(mask, dtype=np.float)[:, :, 0] / 255.).astype(image.dtype)
-    return (1 - mask) * image + mask * np.array(font_color).reshape(1, 1, -1)
+    if isinstance(images, np.ndarray) and images.ndim == 4:
+        res = images.copy()
+        ims = [res[:, :, :, i] for i in range(res.shape[3])]
+    else:
+        res = [image.copy() for image in images]
+        ims = res
+    for im, label in zip(ims, labels):
+        mask = render_label(str(label), font_path, font_size)
+        height = min(mask.shape[0], im.shape[0])
+        width = min(mask.shape[1], im.shape[1])
+        # blend only the label region
+        alpha = mask[:height, :width, np.newaxis]
+        color = np.resize(np.array(font_color, dtype=np.float32), im.shape[2])
+        if np.issubdtype(im.dtype, np.integer):
+            color = color * np.iinfo(im.dtype).max
+        region = im[:height, :width]
+        blended = (1 - alpha) * region + alpha * color
+        region[...] = np.rint(blended) if np.issubdtype(im.dtype, np.integer) else blended
+    return res
+
+tonemap_pool = None # threads for tonemapping large images, created on first use
+
+def tonemap_value(values, offset=0., scale=1., gamma=1.):
+    return np.power(np.maximum(0., np.minimum(1., (values - offset) * scale)), 1. / gamma)
+
+def to_display(values, dtype):
+    # [0, 1] -> dtype, integer types use their full range
+    if np.issubdtype(dtype, np.integer):
+        return np.rint(values * np.iinfo(dtype).max).astype(dtype)
+    return np.asarray(values, dtype=dtype)
+
+@functools.lru_cache(maxsize=32)
+def tonemap_lut(offset, scale, gamma, num_levels=256, lo=0., step=1., dtype=np.float64):
+    """lookup table mapping the integer codes k (representing lo + k * step) to tonemapped values in [0, 1] (or [0, 255] for uint8)"""
+    lut = to_display(tonemap_value(lo + step * np.arange(num_levels, dtype=np.float64), offset, scale, gamma), dtype)
+    lut.setflags(write=False) # shared between all calls
+    return lut
+
+def tonemap_tile(src, dst, offset, scale, gamma):
+    # all steps in place on a single float32 temporary of the tile's size
+    tmp = np.subtract(src, offset, dtype=np.float32)
+    np.multiply(tmp, scale, out=tmp)
+    # fmax / fmin also map NaNs to 0
+    np.fmin(np.fmax(tmp, 0., out=tmp), 1., out=tmp)
+    if gamma != 1.:
+        np.power(tmp, 1. / gamma, out=tmp)
+    if np.issubdtype(dst.dtype, np.integer):
+        np.multiply(tmp, np.iinfo(dst.dtype).max, out=tmp)
+        np.rint(tmp, out=tmp)
+    dst[...] = tmp
+
+def tonemap_float(src, dst, offset, scale, gamma, tile_pixels=2 ** 16):
+    # split into row tiles which are processed in parallel, numpy releases the GIL for the arithmetic
+    global tonemap_pool
+    rows = max(1, tile_pixels // max(1, src.shape[1]))
+    if src.shape[0] <= 4 * rows:
+        tonemap_tile(src, dst, offset, scale, gamma)
+        return
+    if tonemap_pool is None:
+        from concurrent.futures import ThreadPoolExecutor
+        tonemap_pool = ThreadPoolExecutor()
+    jobs = [tonemap_pool.submit(tonemap_tile, src[r : r + rows], dst[r : r + rows], offset, scale, gamma)
+            for r in range(0, src.shape[0], rows)]
+    for job in jobs:
+        job.result()
+
+def tonemap(image, offset=0., scale=1., gamma=1., window=None, quantized=None, out=None, dtype=np.float64):
+    """map image values to RGB in [0, 1] via clip((image - offset) * scale, 0, 1)^(1 / gamma)
+
+    window: optional (y0, y1, x0, x1) region, only that part of image is tonemapped
+    quantized: optional (codes, lo, step) as returned by quantize(image), tonemapped through a lookup table
+    out: optional output array that is reused if its shape and dtype fit
+    dtype: output type, uint8 maps to [0, 255] for direct display
+    """
+    if isinstance(image, np.matrix):
+        image = np.array(image)
+    if image.shape[2] != 1 and image.shape[2] != 2 and image.shape[2] != 3:
+        # project to RGB
+        raise Exception('spectral to RGB conversion not implemented')
+    if window is None:
+        window = (0, image.shape[0], 0, image.shape[1])
+    region = (slice(window[0], window[1]), slice(window[2], window[3]))
+    src = image[region]
+    height, width, channels = src.shape
+    # two channels are padded by two zero channels, one channel is repeated
+    shape = (height, width, 4 if channels == 2 else 3)
+    if out is None or out.shape != shape or out.dtype != dtype:
+        out = np.empty(shape, dtype=dtype)
+    dst = out[:, :, :channels]
+    if image.dtype == np.uint8 or image.dtype == np.uint16:
+        # integer images: single gather from a table over all possible values
+        np.take(tonemap_lut(offset, scale, gamma, np.iinfo(image.dtype).max + 1, dtype=dtype), src, out=dst, mode='clip')
+    elif not quantized is None:
+        codes, lo, step = quantized
+        np.take(tonemap_lut(offset, scale, gamma, 2 ** 16, lo, step, dtype=dtype), codes[region], out=dst, mode='clip')
+    else:
+        tonemap_float(src, dst, offset, scale, gamma)
+    if channels == 1:
+        out[:, :, 1:] = dst
+    elif channels == 2:
+        out[:, :, 2:] = to_display(tonemap_value(0., offset, scale, gamma), dtype)
+    return out
+
+def quantize(image, bits=16):
+    """quantize a float image to unsigned integer codes, values are reconstructed as lo + code * step
+
+    lo and step are taken over the finite values, NaN and -inf are given the lowest code and +inf the highest
+    """
+    finite = finite_values(image)
+    lo = float(np.min(finite)) if finite.size else 0.
+    hi = float(np.max(finite)) if finite.size else 0.
+    max_code = 2 ** bits - 1
+    step = (hi - lo) / max_code if hi > lo else 1.
+    # float16 would overflow, float32 represents all codes exactly
+    tmp = np.subtract(image, lo, dtype=np.float64 if image.dtype == np.float64 else np.float32)
+    np.multiply(tmp, 1. / step, out=tmp)
+    # fmax / fmin also map NaNs to 0
+    np.fmin(np.fmax(tmp, 0., out=tmp), max_code, out=tmp)
+    np.rint(tmp, out=tmp)
+    return tmp.astype(np.uint8 if bits <= 8 else np.uint16), lo, step
+
+def downsample(image, factor=2, mode='mean'):
+    """reduce the resolution of an image by factor, averaging (mode 'mean') or taking the maximum (mode 'max', keeps
+    isolated bright pixels visible) of factor x factor blocks, trailing rows/columns that do not fill a block are dropped"""
+    height, width = image.shape[0] // factor, image.shape[1] // factor
+    blocks = image[:factor * height, :factor * width].reshape((height, factor, width, factor) + image.shape[2:])
+    if mode == 'max':
+        return blocks.max(axis=(1, 3))
+    elif mode != 'mean':
+        raise Exception('unknown downsampling mode: %s' % mode)
+    res = blocks.mean(axis=(1, 3))
+    if np.issubdtype(image.dtype, np.integer):
+        res = np.rint(res)
+    return res.astype(image.dtype, copy=False)
+
+def finite_values(image):
+    """image itself if all its values are finite, otherwise a flat array of its finite values"""
+    if image.dtype.kind in 'fc' and not (np.isfinite(np.min(image)) and np.isfinite(np.max(image))):
+        return image[np.isfinite(image)]
+    return image
+
+class HistogramSketch(object):
+    """histogram of the finite values of an image over the bits of their float32 representation
+
+    a bin holds all values whose float32 keys (see float_keys) share the top `bits` bits, i.e. bins are log-spaced with
+    a relative width of 2 ** (9 - bits) independent of the range of the values (an outlier does not coarsen the other
+    bins). only non-empty bins are kept, percentiles are answered in O(log bins) by interpolating within a bin. for
+    subsampled images, the sorted sample is kept instead
+    """
+    def __init__(self, lo, hi, counts, lower, upper, sample=None):
+        self.lo = lo
+        self.hi = hi
+        self.counts = counts # non-empty bins only
+        self.lower = lower # value range of each bin
+        self.upper = upper
+        self.cdf = np.concatenate(([0], np.cumsum(counts)))
+        self.sample = sample # sorted finite values the sketch was built from if they were subsampled
+
+    @classmethod
+    def from_image(cls, image, bits=20, max_samples=None, chunk_size=2 ** 22):
+        """max_samples: only use that many values drawn uniformly at random (with replacement, seeded, hence the same
+        for each call), percentiles are then those of the sample, see samples_for_error (lo and hi are still exact, which
+        takes one pass of np.min / np.max); a regular grid would alias with periodic image content"""
+        sample = None
+        if not max_samples is None and image.size > max_samples:
+            index = np.sort(np.random.default_rng(0).integers(0, image.size, max_samples))
+            # gather without flattening (i.e. copying) cropped views
+            sample = np.sort(finite_values(image[np.unravel_index(index, image.shape)]))
+            if sample.size == 0:
+                sample = None
+        shift = 32 - bits
+        counts = np.zeros(2 ** bits, dtype=np.int64)
+        lo, hi = np.inf, -np.inf
+        # the range is always exact (a sample would miss isolated extremes), chunks of rows bound the temporary keys
+        # (views are not copied as a whole)
+        rows = max(1, chunk_size * len(image) // max(1, image.size))
+        for r in range(0, len(image), rows):
+            chunk = finite_values(image[r : r + rows])
+            if chunk.size == 0:
+                continue
+            lo = min(lo, float(np.min(chunk)))
+            hi = max(hi, float(np.max(chunk)))
+            if sample is None:
+                counts += np.bincount((float_keys(chunk) >> shift).ravel(), minlength=2 ** bits)
+        if lo > hi:
+            return cls(0., 0., np.array([0]), np.zeros(1), np.zeros(1))
+        if not sample is None:
+            return cls(lo, hi, np.array([sample.size]), np.array([lo]), np.array([hi]), sample)
+        bins = np.flatnonzero(counts)
+        lower = np.clip(float_values(bins.astype(np.uint32) << shift), lo, hi)
+        # the upper end of a bin is where the next one starts (or the largest key for the last bin)
+        upper = np.clip(float_values(np.minimum((bins.astype(np.uint64) + 1) << shift, 2 ** 32 - 1).astype(np.uint32)), lo, hi)
+        return cls(lo, hi, counts[bins], lower, upper)
+
+    def percentile(self, q):
+        """np.percentile(values, q) over the finite values of the image (or the sample) the sketch was built from,
+        exact for samples, otherwise interpolated within the bin holding the rank. q = 0 and 100 give the exact range"""
+        q = np.asarray(q, dtype=float)
+        n = self.cdf[-1]
+        if self.hi <= self.lo:
+            return np.full(q.shape, self.lo)
+        ranks = q / 100. * (n - 1)
+        if not self.sample is None:
+            res = np.interp(ranks, np.arange(n), self.sample)
+        else:
+            lower = np.floor(ranks)
+            upper = np.minimum(lower + 1, n - 1)
+            lower_values = self.value_at(lower)
+            res = lower_values + (ranks - lower) * (self.value_at(upper) - lower_values)
+        return np.where(q <= 0, self.lo, np.where(q >= 100, self.hi, res))
+
+    def value_at(self, ranks):
+        # estimated values of the given (integer) ranks, the values of a bin are assumed to be evenly spread over its range
+        b = np.minimum(np.searchsorted(self.cdf, ranks, side='right') - 1, len(self.counts) - 1)
+        t = np.clip((ranks - self.cdf[b] + 0.5) / self.counts[b], 0., 1.)
+        return self.lower[b] + t * (self.upper[b] - self.lower[b])
+
+def float_keys(values):
+    """uint32 keys of values as float32 that sort as the (finite) values do: the sign bit is flipped for positive
+    values and all bits for negative ones"""
+    bits = np.asarray(values, dtype=np.float32).view(np.uint32)
+    return np.where(bits >> 31, ~bits, bits | np.uint32(0x80000000))
+
+def float_values(keys):
+    # inverse of float_keys
+    keys = np.asarray(keys, dtype=np.uint32)
+    return np.where(keys >> 31, keys & np.uint32(0x7fffffff), ~keys).view(np.float32).astype(np.float64)
+
+def nonzero_bounds(image):
+    """tight bounding box (y0, y1, x0, x1) around all pixels with positive channel sum, the full image if there are none"""
+    mask = np.sum(image, axis=2) > 0
+    rows = np.flatnonzero(mask.any(axis=1))
+    if not len(rows):
+        return 0, image.shape[0], 0, image.shape[1]
+    cols = np.flatnonzero(mask[rows[0] : rows[-1] + 1].any(axis=0))
+    return int(rows[0]), int(rows[-1]) + 1, int(cols[0]), int(cols[-1]) + 1 # +1 to allow easier indexing
+
+def samples_for_error(error, confidence=0.95):
+    """number of i.i.d. random samples for which the percentiles of the sample are off by at most error (in percent, i.e.
+    in rank, not in value) with the given confidence, follows from the Dvoretzky-Kiefer-Wolfowitz inequality"""
+    return int(np.ceil(np.log(2. / (1. - confidence)) / (2. * (error / 100.) ** 2)))
+
+def fill_dtype(dtype, value):
+    """dtype, promoted as needed to hold value (e.g. uint8 to uint16 for 300, to int16 for -1 and to float16 for 0.5
+    or NaN), integral floats count as integers"""
+    value = float(value)
+    if np.isfinite(value) and value.is_integer() and abs(value) < 2 ** 63:
+        value = int(value)
+    return np.result_type(dtype, np.min_scalar_type(value))
 
 def pad(image, new_width, new_height, new_num_channels=None, value=0., center=True):
+    """pad image with value to new_height x new_width (x new_num_channels), centered or at the top left
+
+    the result has the image's dtype unless value does not fit into it, see fill_dtype
+    """
     height, width = image.shape[:2]
-    pad_width = new_width - width
-    pad_height = new_height - height
-    margins0 = [pad_height // 2, pad_height - pad_height // 2]
-    margins1 = [pad_width // 2, pad_width - pad_width // 2]
-
-    image = np.concatenate((value * np.ones((margins0[0],) + image.shape[1:4], dtype=image.dtype),
-                            image,
-                            value * np.ones((margins0[1],) + image.shape[1:4], dtype=image.dtype)), axis=0)
-    image = np.concatenate((value * np.ones((image.shape[0], margins1[0]) + image.shape[2:4], dtype=image.dtype),
-                            image,
-                            value * np.ones((image.shape[0], margins1[1]) + image.shape[2:4], dtype=image.dtype)), axis=1)
-    if not new_num_channels is None and image.shape[2] < new_num_channels:
-        image = np.concatenate((image, value * np.ones(image.shape[:2] + (new_num_channels - image.shape[2]), dtype=image.dtype)), axis=2)
+    num_channels = image.shape[2] if image.ndim > 2 else None
+    if not new_num_channels is None and not num_channels is None and num_channels < new_num_channels:
+        num_channels = new_num_channels
+    shape = (new_height, new_width) + ((num_channels,) + image.shape[3:] if image.ndim > 2 else ())
+    # np.full keeps the image's dtype (value * np.ones would promote e.g. uint8 to float64)
+    res = np.full(shape, value, dtype=fill_dtype(image.dtype, value))
+    y, x = pad_offsets(image, new_width, new_height, center)
+    if image.ndim > 2:
+        res[y : y + height, x : x + width, : image.shape[2]] = image
+    else:
+        res[y : y + height, x : x + width] = image
+    return res
 
-    return image
+def pad_offsets(image, new_width, new_height, center=True):
+    if not center:
+        return 0, 0
+    return (new_height - image.shape[0]) // 2, (new_width - image.shape[1]) // 2
+
+def pad_images(images, new_width=None, new_height=None, new_num_channels=None, value=0., center=True, dtype=None, out=None):
+    """pad a list of images into one (N, H, W, C) array, by default to the largest size and number of channels
+
+    out: previously returned array to be overwritten, if shape and type match
+    dtype: by default that of the images, promoted if value does not fit into it (see fill_dtype)
+    """
+    images = [np.atleast_3d(im) for im in images]
+    height = new_height or max(im.shape[0] for im in images)
+    width = new_width or max(im.shape[1] for im in images)
+    num_channels = new_num_channels or max(im.shape[2] for im in images)
+    dtype = dtype or fill_dtype(np.result_type(*images), value)
+    shape = (len(images), height, width, num_channels)
+    if out is None or out.shape != shape or out.dtype != dtype:
+        out = np.full(shape, value, dtype=dtype)
+    else:
+        out.fill(value)
+    for n, im in enumerate(images):
+        y, x = pad_offsets(im, width, height, center)
+        out[n, y : y + im.shape[0], x : x + im.shape[1], : im.shape[2]] = im
+    return out
 
 def collage(images, **kwargs):
+    """arrange images in a grid of nc x nr tiles
+
+    images may differ in size and number of channels, each is centered in a tile of the largest size and missing
+    channels are zero. the collage is allocated once (or taken from out, if it matches) and each image is written
+    directly into its tile.
+    """
     if isinstance(images, np.ndarray):
         if images.ndim == 4:
             images = [images[:, :, :, i] for i in range(images.shape[3])]
         else:
             images = [images]
+    images = [np.atleast_3d(im) for im in images]
 
     nims = len(images)
 
     nc = kwargs.get('nc', int(np.ceil(np.sqrt(nims))))  # number of columns
     nr = kwargs.get('nr', int(np.ceil(nims / nc)))  # number of rows
     bw = kwargs.get('bw', 0)  # border width
+    bv = kwargs.get('bv', 0.)  # border value
     transpose = kwargs.get('transpose', False)
     transposeIms = kwargs.get('transposeIms', False)
+    # storage type of the collage, by default that of the images, promoted if bv does not fit into it (see fill_dtype)
+    dtype = kwargs.get('dtype', fill_dtype(np.result_type(*images), bv if bw else 0))
+    out = kwargs.get('out')  # previous collage to be overwritten, if shape and type match
 
     if nr * nc < nims:
         nc = int(np.ceil(np.sqrt(nims)))
         nr = int(np.ceil(nims / nc))
 
-    # pad array so it matches the product nc * nr
-    padding = nc * nr - nims
-    h, w, numChans = images[0].shape[:3]
-    ims = images + [np.zeros((h, w, numChans))] * padding
-    coll = np.stack(ims, axis=3)
-    coll = np.reshape(coll, (h, w, numChans, nc, nr))
-    # 0  1  2   3   4
-    # y, x, ch, co, ro
-    if bw:
-        # pad each patch by border if requested
-        coll = np.append(coll, np.zeros((bw,) + coll.shape[1: 5]), axis=0)
-        coll = np.append(coll, np.zeros((coll.shape[0], bw) + coll.shape[2: 5]), axis=1)
-    if transpose:
-        nim0 = nr
-        nim1 = nc
-        if transposeIms:
-            dim0 = w
-            dim1 = h
-            #                          nr w  nc h  ch
-            coll = np.transpose(coll, (4, 1, 3, 0, 2))
-        else:
-            dim0 = h
-            dim1 = w
-            #                          nr h  nc w  ch
-            coll = np.transpose(coll, (4, 0, 3, 1, 2))
+    h = max(im.shape[0] for im in images)
+    w = max(im.shape[1] for im in images)
+    numChans = max(im.shape[2] for im in images)
+    dim0, dim1 = (w, h) if transposeIms else (h, w)
+    # image n goes to tile (n // nr, n % nr), or (n % nr, n // nr) if transposed
+    nim0, nim1 = (nr, nc) if transpose else (nc, nr)
+    shape = ((dim0 + bw) * nim0, (dim1 + bw) * nim1, numChans)
+    if out is None or out.shape != shape or out.dtype != dtype:
+        out = np.zeros(shape, dtype=dtype)
     else:
-        nim0 = nc
-        nim1 = nr
+        out.fill(0)
+    if bw:
+        # border below and right of each tile
+        for t in range(nim0):
+            out[t * (dim0 + bw) + dim0 : (t + 1) * (dim0 + bw)] = bv
+        for t in range(nim1):
+            out[:, t * (dim1 + bw) + dim1 : (t + 1) * (dim1 + bw)] = bv
+
+    for n, im in enumerate(images):
+        t0, t1 = (n % nr, n // nr) if transpose else (n // nr, n % nr)
+        # center in the tile as pad() does
+        y, x = pad_offsets(im, w, h)
         if transposeIms:
-            dim0 = w
-            dim1 = h
-            #                          nc w  nr h  ch
-            coll = np.transpose(coll, (3, 1, 4, 0, 2))
-        else:
-            dim0 = h
-            dim1 = w
-            #                          nc h  nr w  ch
-            coll = np.transpose(coll, (3, 0, 4, 1, 2))
-    coll = np.reshape(coll, ((dim0 + bw) * nim0, (dim1 + bw) * nim1, numChans))
+            y, x = x, y
+            im = im.transpose((1, 0, 2))
+        y += t0 * (dim0 + bw)
+        x += t1 * (dim1 + bw)
+        out[y : y + im.shape[0], x : x + im.shape[1], : im.shape[2]] = im
+
+    return out
 
-    return coll
+def loadmat(filename, variable_names=None, lazy=False):
+    """wrapper around scipy.io.loadmat that avoids conversion of nested matlab structs to np.arrays
 
-def loadmat(filename):
-    """wrapper around scipy.io.loadmat that avoids conversion of nested matlab structs to np.arrays"""
-    mat = spio.loadmat(filename, struct_as_record=False, squeeze_me=True)
+    reads all variables (or those in variable_names) into a dict, v7.3 (HDF5) files are read via h5py
+    lazy: instead return a read-only, dict-like pytb.matfile.MatFile that reads each variable on first access,
+          uncompressed v5 arrays are memory-mapped and v7.3 arrays are pytb.matfile.MatDataset objects reading from
+          the file on indexing, both in MATLAB's axis order (squeezed); it has no __header__ / __version__ /
+          __globals__ entries
+    """
+    from pytb.matfile import MatFile, is_hdf5, to_memory
+    if lazy:
+        return MatFile(filename, variable_names)
+    if is_hdf5(filename):
+        with MatFile(filename, variable_names) as mat:
+            return to_memory(mat)
+    mat = spio.loadmat(filename, variable_names=variable_names, struct_as_record=False, squeeze_me=True)
     for key in mat:
-        if isinstance(mat[key], spio.matlab.mio5_params.mat_struct):
+        if isinstance(mat[key], spio.matlab.mat_struct):
             mat[key] = to_dict(mat[key])
     return mat
 
@@ -117,19 +420,15 @@ def to_dict(matobj):
     output = {}
     for fn in matobj._fieldnames:
         val = matobj.__dict__[fn]
-        if isinstance(val, spio.matlab.mio5_params.mat_struct):
-            output[fn] = toDict(val)
+        if isinstance(val, spio.matlab.mat_struct):
+            output[fn] = to_dict(val)
         else:
             output[fn] = val
     return output
 
 def strparse(strings, pattern, numeric=False, *args):
-    res = [re.match(pattern, string) for string in strings]
-    matching = np.nonzero(np.array([not r is None for r in res]))
-    res = np.array(res)[matching]
-    res = np.array([r.groups() for r in res])
+    res = np.array(list(iter_strparse(strings, pattern)))
     if numeric:
-        print(len(args), args)
         if len(args) == 1:
             res = res.astype(args[0])
         elif len(args) == res.shape[1]:
@@ -141,9 +440,121 @@ def strparse(strings, pattern, numeric=False, *args):
             raise Exception('number of type specifiers must equal the number of matching groups in the pattern!')
     return res
 
-def read_exr(fname, outputType=np.float16):
+def iter_strparse(strings, pattern):
+    """generator over the groups of the strings matching pattern"""
+    match = re.compile(pattern).match
+    for string in strings:
+        m = match(string)
+        if not m is None:
+            yield m.groups()
+
+def strparse_columns(strings, pattern, types=str, processes=None, chunk_size=2 ** 16, return_index=False):
+    """columnar strparse: one array per group of pattern for the strings matching it
+
+    types: one type for all groups or a list with one type per group
+    processes: number of worker processes parsing chunks of chunk_size strings, None parses in this process
+    return_index: additionally return the indices of the matching strings
+    """
+    pattern = re.compile(pattern)
+    if not isinstance(types, (list, tuple)):
+        types = [types] * pattern.groups
+    if len(types) != pattern.groups:
+        raise Exception('number of type specifiers must equal the number of matching groups in the pattern!')
+    if processes is None:
+        columns, index = parse_columns((strings, pattern, types, 0))
+    else:
+        import itertools
+        from concurrent.futures import ProcessPoolExecutor
+        strings = iter(strings)
+        chunks = iter(lambda: list(itertools.islice(strings, chunk_size)), [])
+        jobs = ((chunk, pattern, types, ci * chunk_size) for ci, chunk in enumerate(chunks))
+        with ProcessPoolExecutor(processes) as pool:
+            results = list(pool.map(parse_columns, jobs))
+        columns = [np.concatenate([res[0][gi] for res in results]) if results else np.array([], dtype=t) for gi, t in enumerate(types)]
+        index = np.concatenate([res[1] for res in results]) if results else np.array([], dtype=np.int64)
+    return (columns, index) if return_index else columns
+
+def parse_columns(job):
+    # job: (strings, compiled pattern, types, index of the first string)
+    strings, pattern, types, start = job
+    match = pattern.match
+    index = []
+    rows = []
+    for i, string in enumerate(strings, start):
+        m = match(string)
+        if not m is None:
+            index.append(i)
+            rows.append(m.groups())
+    index = np.array(index, dtype=np.int64)
+    if not rows:
+        return [np.array([], dtype=t) for t in types], index
+    # type conversion of whole string columns happens in numpy instead of per value in python
+    return [np.array(col).astype(t) for col, t in zip(zip(*rows), types)], index
+
+def read_exr(fname, outputType=np.float32, channels='all', out=None):
+    """read an OpenEXR image, returns its pixels (H, W, C) and the names of the channels that were read
+
+    channels: a group name as understood by pyexr ('all', 'default' or a layer such as 'diffuse') or a list of channel
+              and group names
+    outputType: type of the returned pixels (np.float16 keeps half precision data at half the memory), None keeps the
+                stored precision
+    out: array of shape (H, W, C) to read into, e.g. a view into a preallocated sequence
+    """
     import pyexr
     file = pyexr.open(fname)
-    channels = file.channel_map['all']
-    pixels = file.get(group='all', precision=pyexr.FLOAT)
-    return pixels, channels
\ No newline at end of file
+    try:
+        names = exr_channels(file, channels)
+        # only the selected channels are decoded, in their stored precision
+        data = file.input_file.channels(names)
+        dtypes = [pyexr.exr.NP_PRECISION[str(file.channel_precision[c])] for c in names]
+        if out is None:
+            out = np.empty((file.height, file.width, len(names)), dtype=np.result_type(*dtypes) if outputType is None else outputType)
+        for ci, (buf, dtype) in enumerate(zip(data, dtypes)):
+            out[:, :, ci] = np.frombuffer(buf, dtype=dtype).reshape(file.height, file.width)
+    finally:
+        file.close()
+    return out, names
+
+def exr_channels(file, channels):
+    if isinstance(channels, str):
+        channels = [channels]
+    names = []
+    for group in channels:
+        if not group in file.channel_map:
+            raise Exception('channel or group %s not found, available channels: %s' % (group, ', '.join(file.channels)))
+        names += file.channel_map[group]
+    return names
+
+def read_exr_sequence(fnames, outputType=None, channels='all', cache=None, workers=None):
+    """read a list of OpenEXR images of equal size into one (H, W, C, N) array in a thread pool
+
+    cache: optional .npy file the sequence is written to and memory-mapped from, reused as long as it is newer than
+           all images
+    outputType: as for read_exr, by default the stored precision of the first image's channels
+    returns the pixels and the names of the channels that were read, as read_exr
+    """
+    import os
+    from concurrent.futures import ThreadPoolExecutor
+    import pyexr
+    file = pyexr.open(fnames[0])
+    try:
+        names = exr_channels(file, channels)
+        shape = (file.height, file.width, len(names), len(fnames))
+        if outputType is None:
+            outputType = np.result_type(*[pyexr.exr.NP_PRECISION[str(file.channel_precision[c])] for c in names])
+    finally:
+        file.close()
+    if cache is None:
+        pixels = np.empty(shape, dtype=outputType)
+    else:
+        if os.path.exists(cache) and os.path.getmtime(cache) >= max(os.path.getmtime(fname) for fname in fnames):
+            pixels = np.load(cache, mmap_mode='r')
+            if pixels.shape == shape and pixels.dtype == outputType:
+                return pixels, names
+        pixels = np.lib.format.open_memmap(cache, mode='w+', dtype=outputType, shape=shape)
+    with ThreadPoolExecutor(workers) as pool:
+        # all images are read with the channels found in the first one
+        list(pool.map(lambda i: read_exr(fnames[i], outputType, names, pixels[:, :, :, i]), range(len(fnames))))
+    if not cache is None:
+        pixels.flush()
+    return pixels, names